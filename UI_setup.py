@@ -1,35 +1,56 @@
 import sounddevice as sd
-import numpy as np
-import wave
-import tempfile
 import tkinter as tk
 from tkinter import ttk
 import json
 from pathlib import Path
 import os
+import queue
+import threading
 import time
 
-from textrecongnition.text_detection import process_audio
-from emorecognition.emreco import emo_predictor
-from chains.main import conversational_rag_chain
+# Only light modules are imported here so the window shows up right away. Whisper, torch,
+# transformers and the LangChain/LangGraph stack are imported (and the models warmed up)
+# on a background thread once the window is up; see start_background_warmup.
+from textrecongnition.streaming_asr import StreamingTranscriber
 # from chains.main import store_init, store_messages_on_exit
 # from chains.main import store_init_2, store_messages_on_exit_2
-from textrecongnition.text_to_speech import text_to_speech
-from langgraph.checkpoint.memory import MemorySaver
-
-recording = []
-full_conversation = []
+from textrecongnition.text_to_speech import iter_sentences, SpeechQueue
+from pipeline.workers import StagePipeline
+from pipeline.capture import CaptureBuffer, archive_recording
+from pipeline.warmup import start_background_warmup
+from chains import history_store
+
+# CaptureBuffer of the recording in progress
+recording = None
 is_recording = False
 fs = 16000  # Sampling rate
 recording_stream = None
-memory = MemorySaver()
+# Transcribe speech segments while the user is still recording
+STREAMING_ASR = True
+transcriber = None
+# Worker pipeline for the audio -> LLM -> TTS stages, and the callbacks it hands back to Tk
+turn_pipeline = None
+session_started_at = None
+ui_queue = queue.Queue()
+# Seconds between redraws of a reply bubble while it streams in
+UPDATE_INTERVAL = 0.1
+# Speaks reply sentences in order, across turns, while the LLM is still generating
+speaker = None
+# chains.main, imported on first use by load_chains()
+llm_chain = None
+_llm_chain_lock = threading.Lock()
 DATA_DIR = Path("data/user_data")
+# Recordings are kept in memory only; set RECORDING_ARCHIVE_DIR to also save each one as a WAV
+ARCHIVE_DIR = os.environ.get("RECORDING_ARCHIVE_DIR")
 os.makedirs(DATA_DIR, exist_ok=True)
 
 def callback(indata, frames, time, status):
     """ Callback function to store recorded audio """
     if is_recording:
-        recording.append(indata.copy())
+        # Copied into the preallocated buffer (sounddevice reuses indata); block is a view of it
+        block = recording.append(indata)
+        if transcriber:
+            transcriber.feed(block)
 
 # def save_conversation_history(user_id, conversation, data_dir):
 #     user_file = data_dir / f"{user_id}.json"
@@ -54,27 +75,6 @@ def callback(indata, frames, time, status):
 #             print(f"Error loading initial messages for {user_id}: {e}")
 #             return []
 
-def load_initial_messages_as_string(user_id: str) -> str:
-    """Load previous messages and convert them to a plain string conversation log."""
-    user_file = DATA_DIR / f"{user_id}.json"
-    if user_file.exists():
-        try:
-            with open(user_file, 'r', encoding='utf-8') as f:
-                messages = json.load(f)
-                print(f"Loaded {len(messages)} messages for user: {user_id}")
-
-                conversation_str = ""
-                for msg in messages:
-                    speaker = msg.get("type", "unknown")
-                    content = msg.get("content", "")
-                    conversation_str += f"{speaker}: {content.strip()}\n\n"
-
-                return conversation_str.strip()
-
-        except Exception as e:
-            print(f"❌ Error loading messages for {user_id}: {e}")
-    return ""
-
 
 def start_recording(event, record_button=None, stop_button = None):
     """ Starts recording when button is pressed """
@@ -83,8 +83,15 @@ def start_recording(event, record_button=None, stop_button = None):
         record_button.config(relief=tk.SUNKEN, bg="#00804C", fg="#001F3F")  # Pressed color
     if stop_button:
         stop_button.config(relief=tk.SUNKEN, bg="#1E488F", fg="#001F3F")
-    global is_recording, recording, recording_stream
-    recording = []
+    global is_recording, recording, recording_stream, transcriber
+    # A new recording supersedes any turn that has not produced its answer yet
+    if turn_pipeline:
+        turn_pipeline.cancel_pending()
+    # ...including the speech of replies that are already fully generated
+    if speaker:
+        speaker.cancel()
+    recording = CaptureBuffer(sr=fs)
+    transcriber = StreamingTranscriber(sr=fs).start() if STREAMING_ASR else None
     is_recording = True
     recording_stream = sd.InputStream(callback=callback, samplerate=fs, channels=1)
     recording_stream.start()
@@ -100,7 +107,7 @@ def stop_recording(event=None, record_button=None, stop_button=None):
     if stop_button:
         stop_button.config(relief=tk.RAISED, bg="#001F3F")  # Stop button color
 
-    global is_recording, recording_stream
+    global is_recording, recording_stream, transcriber
     is_recording = False
 
     if recording_stream:
@@ -108,65 +115,148 @@ def stop_recording(event=None, record_button=None, stop_button=None):
         recording_stream.close()
         recording_stream = None
 
-    save_and_process_audio()
+    # Hand this recording to the worker pipeline so the window stays responsive
+    turn_pipeline.submit((recording, transcriber))
+    transcriber = None
 
 
-# def chain_response(text_result, history = ''):
-#     return conversational_rag_chain({"context": text_result["emotions"], "input": text_result["text"]}, 1)
-def chain_response(text_result, history_context=""):
-    combined_input = f"{history_context.strip()}\n\n{text_result['text']}".strip()
-    return conversational_rag_chain({
-        "context": text_result["emotions"],
-        "input": combined_input
-    }, 1)
+def load_chains():
+    """ Imports the LLM chain on first use and switches it to per-user threads that survive restarts """
+    global llm_chain
+    with _llm_chain_lock:
+        if llm_chain is None:
+            from chains import main
+            main.use_sqlite_checkpointer()
+            llm_chain = main
+    return llm_chain
 
 
+def _chain_input(text_result, history_context):
+    if text_result.get("greeting"):
+        # The greeting seeds a new thread, so the history summary is kept with it in the conversation
+        return {"context": text_result["emotions"],
+                "input": f"{history_context.strip()}\n\n{text_result['text']}".strip()}
+    # Retrieved exchanges only go into this turn's prompt; the thread stores just what the user said
+    return {"context": text_result["emotions"], "input": text_result["text"], "history": history_context.strip()}
 
-def save_and_process_audio():
-    """ Saves recorded audio and processes it """
-    if not recording:
-        return
 
-    audio_data = np.concatenate(recording, axis=0)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_wav:
-        with wave.open(temp_wav.name, 'wb') as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(fs)
-            wf.writeframes((audio_data * 32767).astype(np.int16).tobytes())
+def chain_response(text_result, history_context="", user_id=None):
+    return load_chains().conversational_rag_chain(
+        _chain_input(text_result, history_context), user_id or current_user_id)
 
-    result = process_audio(temp_wav.name)
-    add_message(result["text"], "right")  # User message
-    response = chain_response(result)
-    add_message(response, "left")  # Bot response
 
-    # Speak out the AI response
-    text_to_speech(response)  # Calls the TTS function
+def chain_response_stream(text_result, history_context="", user_id=None):
+    return load_chains().conversational_rag_chain_stream(
+        _chain_input(text_result, history_context), user_id or current_user_id)
 
 
-def save_conversation_history(user_id, new_conversation, data_dir):
-    user_file = data_dir / f"{user_id}.json"
-    all_messages = []
+def run_on_ui(fn, *args):
+    """ Queue a call for the Tk main loop (Tk widgets must only be touched from that thread) """
+    ui_queue.put((fn, args))
 
-    if user_file.exists():
-        try:
-            with open(user_file, "r", encoding="utf-8") as f:
-                all_messages = json.load(f)
-        except json.JSONDecodeError:
-            pass  # Continue with empty history
-
-    all_messages.extend(new_conversation)
 
+def process_ui_queue():
+    """ Runs the queued UI updates on the main loop and re-schedules itself with root.after """
+    while True:
+        try:
+            fn, args = ui_queue.get_nowait()
+        except queue.Empty:
+            break
+        fn(*args)
+    root.after(50, process_ui_queue)
+
+
+def save_and_process_audio(turn, captured):
+    """ Processes the recorded audio (audio stage, runs on a worker thread) """
+    buffer, turn_transcriber = captured
+    # Only the last speech segment is still left to transcribe at this point
+    streamed_text = turn_transcriber.finish() if turn_transcriber else None
+    if buffer is None or len(buffer) == 0:
+        return None
+
+    # The float32 samples go straight to the models; nothing touches the disk unless archiving is on
+    audio_data = buffer.audio()
+    if ARCHIVE_DIR:
+        try:
+            archive_recording(audio_data, fs, ARCHIVE_DIR, prefix=current_user_id)
+        except OSError as e:
+            print(f"❌ Failed to archive recording: {e}")
+
+    # Fall back to transcribing the whole clip if the VAD heard no speech
+    from textrecongnition.text_detection import process_audio
+    result = process_audio(audio_data, text=streamed_text or None)
+    if not turn.cancelled:
+        run_on_ui(add_message, result["text"], "right")  # User message
+    return result
+
+
+def respond(turn, result):
+    """ Streams the chatbot response into a bubble and speaks it sentence by sentence (LLM stage) """
+    from chains.context_builder import build_history_context
+    from chains.retrieval import retrieve_context
+
+    history_context = ""
+    # A conversation restored from the checkpointer already carries its context
+    if result.get("greeting") and not load_chains().has_thread_state(result["user_id"]):
+        # Recent turns verbatim plus a cached summary of the older ones, within a token budget
+        history_context = build_history_context(result["user_id"])
+    elif not result.get("greeting"):
+        # Only the past exchanges relevant to what was just said go into the prompt
+        try:
+            history_context = retrieve_context(current_user_id, result["text"], before_ts=session_started_at)
+        except Exception as e:
+            print(f"❌ Retrieval failed for {current_user_id}: {e}")
+
+    if turn.cancelled:
+        return None
+    bubble = {}
+    reply = ""
+    last_update = 0.0
+
+    def shown(tokens):
+        nonlocal reply, last_update
+        for token in tokens:
+            if turn.cancelled:
+                return
+            if not reply:
+                run_on_ui(add_message, "", "left", bubble)  # Bot response, filled in as tokens arrive
+            reply += token
+            # Redraw the bubble a few times a second, not on every token
+            if time.monotonic() - last_update >= UPDATE_INTERVAL:
+                last_update = time.monotonic()
+                run_on_ui(update_message, bubble, reply)
+            yield token
+
+    # Each finished sentence goes to TTS while the next ones are still being generated
+    for sentence in iter_sentences(shown(chain_response_stream(result, history_context=history_context, user_id=result.get("user_id")))):
+        if turn.cancelled:
+            break
+        speaker.say(sentence, turn)
+
+    if turn.cancelled:
+        # Superseded by a new recording: drop the partial reply instead of keeping or saving it
+        if reply:
+            run_on_ui(remove_message, bubble)
+        return None
+    if reply:
+        run_on_ui(update_message, bubble, reply)
+
+    turn_messages = [] if result.get("greeting") else [{"type": "human", "content": result["text"]}]
+    turn_messages.append({"type": "ai", "content": reply})
+    save_turn(current_user_id, turn_messages)
+    return None
+
+
+def save_turn(user_id, messages):
+    """ Appends one finished turn to the user's history (a single atomic append, no file rewrite) """
     try:
-        with open(user_file, "w", encoding="utf-8") as f:
-            json.dump(all_messages, f, indent=2, ensure_ascii=False)
-        print(f"Conversation appended for user: {user_id}")
+        history_store.append_turn(user_id, messages)
     except Exception as e:
         print(f"Failed to save conversation for {user_id}: {e}")
 
 
-def add_message(text, side):
-    """ Adds a new message bubble to the conversation """
+def add_message(text, side, bubble=None):
+    """ Adds a new message bubble to the conversation; pass a dict as bubble to update it later """
     bg_color = "#74C365" if side == "left" else "#001F3F"
     fg_color = "#001F3F" if side == "left" else "#F6F7ED"
 
@@ -181,14 +271,31 @@ def add_message(text, side):
 
     chat_canvas.update_idletasks()
     chat_canvas.yview_moveto(1)  # Auto-scroll
-    
-    full_conversation.append({
-        "type": "human" if side == "right" else "ai",
-        "content": text
-    })
+    if bubble is not None:
+        bubble.update(frame=bubble_frame, label=bubble_label)
+
+
+def remove_message(bubble):
+    """ Removes a bubble created by add_message """
+    bubble["frame"].destroy()
+
+
+def update_message(bubble, text):
+    """ Replaces the text of a bubble created by add_message (used while a reply streams in) """
+    bubble["label"].config(text=text)
+    chat_canvas.update_idletasks()
+    chat_canvas.yview_moveto(1)  # Auto-scroll
 
 def setup_ui():
-    global root, chat_frame, chat_canvas,current_user_id, initial_messages
+    global root, chat_frame, chat_canvas,current_user_id, initial_messages, turn_pipeline, speaker
+
+    turn_pipeline = StagePipeline([
+        ("audio", save_and_process_audio),
+        ("llm", respond),
+    ])
+    speaker = SpeechQueue()
+    # Import the old per-user JSON files into the history store (only once per file)
+    history_store.migrate_json_files(DATA_DIR)
 
     root = tk.Tk()
     root.title("Voice Chat")
@@ -214,32 +321,54 @@ def setup_ui():
     
     #     create_chat_interface()
     def start_session():
-        global current_user_id, initial_messages
+        global current_user_id, initial_messages, session_started_at
         current_user_id = user_entry.get()
+        session_started_at = time.time()
         print(f"Starting session for user: {current_user_id}")
         
-        # Load history as string
-        initial_messages = load_initial_messages_as_string(current_user_id)
-        
         login_frame.destroy()
         create_chat_interface()
 
-        # 👇 Inject initial greeting with history as RAG context
-        greeting_input = {"text": "Here you have the conversational histroy of student, if you get no histroy, generate greeting", "emotions": "neutral"}
-        greeting_response = chain_response(greeting_input, history_context=initial_messages)
-        # add_message("Hello!", "right")  # Display the user's greeting
-        add_message(greeting_response, "left")  # Display the bot's first response
-        text_to_speech(greeting_response)
+        # 👇 Inject initial greeting with history as RAG context; the history is loaded and
+        # the greeting generated and spoken on the worker threads
+        greeting_input = {"text": "Here you have the conversational histroy of student, if you get no histroy, generate greeting", "emotions": "neutral",
+                          "greeting": True, "user_id": current_user_id}
+        turn_pipeline.submit(greeting_input, stage="llm")
 
     tk.Button(login_frame, text="Start Session", command=start_session,
               font=("Arial", 14), bg="#4CAF50", fg="white").pack()
 
+    root.after(50, process_ui_queue)
+    # Import and warm up the heavy parts once the window is on screen
+    root.after(100, start_background_warmup, warmup_steps())
     root.mainloop()
     #root.mainloop()
 
+def warmup_steps():
+    """ What to load in the background: the LLM first (the greeting needs it), then the audio models """
+    def llm():
+        load_chains().keep_alive_ping()
+
+    def audio_models():
+        from textrecongnition import text_detection
+        from emorecognition.emreco import get_ser_model, warmup_ser_model
+        from pipeline.model_registry import warmup
+        warmup(text_detection.get_asr_engine().model_key)
+        warmup_ser_model(get_ser_model())
+
+    def retrieval():
+        from chains.retrieval import EMBEDDING_MODEL
+        from pipeline.model_registry import warmup
+        warmup(EMBEDDING_MODEL)
+
+    return [("llm", llm), ("audio models", audio_models), ("retrieval", retrieval)]
+
+
 def on_exit():
     # store_messages_on_exit(current_user_id, DATA_DIR,1)
-    save_conversation_history(current_user_id, full_conversation, DATA_DIR)
+    # Turns are appended to the history store as they finish, so there is nothing left to save
+    turn_pipeline.stop()
+    speaker.close()
     root.destroy()
 
 def create_chat_interface():
@@ -0,0 +1,213 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# Offline batch analysis: transcript + emotion distribution for every recording in a directory or glob.
+#
+#   python batch_analyze.py "data/sessions/**/*.m4a" --output results.jsonl --workers 8
+#
+# Clips are spread over a process pool; every worker loads the models once (in its initializer)
+# and runs with its own share of torch threads. Each result is appended to the output (.jsonl or
+# .csv) as soon as its clip is done, and running the same command again skips the clips that are
+# already in the output (and retries failed ones, replacing their error rows), so an interrupted run
+# can simply be restarted.
+
+AUDIO_EXTENSIONS = {".wav", ".m4a", ".mp3", ".flac", ".ogg", ".webm"}
+CSV_FIELDS = ["path", "duration_s", "text", "emotion", "emotions", "ser_mode",
+              "decode_s", "vad_s", "asr_s", "ser_s", "total_s", "error"]
+# Clips longer than this (after silence trimming) are scored with sliding windows, so a
+# multi-minute recording never goes through WavLM in one forward pass
+STREAMING_SER_SECONDS = 30.0
+
+
+def find_clips(inputs):
+    """Expand directories (recursively) and glob patterns into a sorted list of absolute audio file paths."""
+    clips = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = (str(path) for path in Path(item).rglob("*"))
+        else:
+            matches = glob.glob(item, recursive=True)
+        # Absolute paths, so a resumed run matches the output rows whatever the working directory or spelling
+        clips.update(os.path.abspath(path) for path in matches
+                     if os.path.isfile(path) and Path(path).suffix.lower() in AUDIO_EXTENSIONS)
+    return sorted(clips)
+
+
+def _drop_partial_line(path):
+    # A run killed mid-write leaves a partial last line; cut it so the clip is redone cleanly
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def processed_paths(output):
+    """
+    Absolute paths already analysed successfully in an existing output file.
+
+    Rows of failed clips are removed from the file: those clips are retried and get a new row.
+    """
+    if not os.path.exists(output):
+        return set()
+    _drop_partial_line(output)
+    fields = None
+    with open(output, newline="", encoding="utf-8") as f:
+        if output.endswith(".csv"):
+            reader = csv.DictReader(f)
+            rows = list(reader)
+            fields = reader.fieldnames
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    done = [row for row in rows if not row.get("error")]
+    if len(done) < len(rows):
+        tmp_path = output + ".tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            if fields is not None:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(done)
+            else:
+                f.writelines(json.dumps(row) + "\n" for row in done)
+        os.replace(tmp_path, output)
+    return {os.path.abspath(row["path"]) for row in done}
+
+
+class ResultWriter:
+    """Append results to a JSONL or CSV file, flushing after every row."""
+
+    def __init__(self, output):
+        self.csv = output.endswith(".csv")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        new_file = not os.path.exists(output) or os.path.getsize(output) == 0
+        self._file = open(output, "a", newline="", encoding="utf-8")
+        if self.csv:
+            fields = CSV_FIELDS
+            if not new_file:
+                # Keep appending in the columns of the existing file (it may predate a new column)
+                with open(output, newline="", encoding="utf-8") as f:
+                    fields = next(csv.reader(f))
+            self._writer = csv.DictWriter(self._file, fieldnames=fields, extrasaction="ignore")
+            if new_file:
+                self._writer.writeheader()
+
+    def write(self, result):
+        if self.csv:
+            row = {key: value for key, value in result.items() if key not in ("emotions", "timings")}
+            row["emotions"] = json.dumps(result["emotions"])
+            row.update({f"{stage}_s": seconds for stage, seconds in result["timings"].items()})
+            self._writer.writerow(row)
+        else:
+            self._file.write(json.dumps(result) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _init_worker(threads, asr_config, ser_backend):
+    """Process pool initializer: pin torch threads and load the models once for this worker."""
+    import torch
+    torch.set_num_threads(threads)
+
+    from emorecognition.emreco import get_ser_model, set_ser_backend
+    from pipeline.model_registry import warmup
+    from textrecongnition import text_detection
+    # ASR and SER run one after the other here, so faster-whisper can use all of the worker's threads
+    text_detection.configure_asr(**asr_config, cpu_threads=threads)
+    if ser_backend:
+        set_ser_backend(ser_backend)
+    warmup(text_detection.get_asr_engine().model_key)
+    get_ser_model()
+
+
+def _timed(fn, *args):
+    start_time = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start_time
+
+
+def analyse_clip(path, streaming_ser_seconds=STREAMING_SER_SECONDS):
+    """Decode, trim, transcribe and score one clip; errors are reported in the result, not raised."""
+    from emorecognition.emreco import emo_predict_streaming, emo_predictor
+    from pipeline.audio_loading import SAMPLE_RATE, load_audio
+    from textrecongnition import text_detection
+
+    result = {"path": path, "duration_s": None, "text": None, "emotion": None, "emotions": {},
+              "ser_mode": None, "timings": {}, "error": None}
+    try:
+        start_time = time.perf_counter()
+        timings = result["timings"]
+        audio, timings["decode"] = _timed(load_audio, path)
+        result["duration_s"] = len(audio) / SAMPLE_RATE
+        audio, timings["vad"] = text_detection._vad_trim(audio)
+        result["text"], timings["asr"] = _timed(text_detection.transcribe_audio, audio)
+        if len(audio) > streaming_ser_seconds * SAMPLE_RATE:
+            result["ser_mode"] = "windows"
+            streamed, timings["ser"] = _timed(emo_predict_streaming, audio)
+            emotions = streamed["emotions"]
+        else:
+            result["ser_mode"] = "whole"
+            emotions, timings["ser"] = _timed(emo_predictor, audio)
+        timings["total"] = time.perf_counter() - start_time
+        result["emotions"] = {label: float(prob) for label, prob in emotions.items()}
+        result["emotion"] = max(result["emotions"], key=result["emotions"].get)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe and score the emotion of many recordings in parallel")
+    parser.add_argument("inputs", nargs="+", help="directories (searched recursively) or glob patterns")
+    parser.add_argument("--output", default="data/output/batch_results.jsonl", help=".jsonl or .csv file")
+    parser.add_argument("--threads-per-worker", type=int, default=2, help="torch threads in each worker")
+    parser.add_argument("--workers", type=int,
+                        help="worker processes, each holding its own copy of the models "
+                             "(default: CPU count / threads per worker)")
+    parser.add_argument("--asr-engine", default="whisper", choices=["whisper", "faster-whisper"])
+    parser.add_argument("--asr-size", default="small")
+    parser.add_argument("--compute-type", default="int8", help="faster-whisper weight type")
+    parser.add_argument("--language", help="pin the language (e.g. en) to skip language detection")
+    parser.add_argument("--ser-backend", help="torch, int8, onnx or onnx-int8")
+    parser.add_argument("--streaming-ser-seconds", type=float, default=STREAMING_SER_SECONDS,
+                        help="score the emotion of longer clips with sliding windows instead of one pass")
+    args = parser.parse_args()
+
+    done = processed_paths(args.output)
+    clips = [clip for clip in find_clips(args.inputs) if clip not in done]
+    print(f"{len(clips)} clips to analyse ({len(done)} already in {args.output})")
+    if not clips:
+        return
+
+    workers = args.workers or max(1, (os.cpu_count() or 1) // args.threads_per_worker)
+    asr_config = {"engine": args.asr_engine, "size": args.asr_size, "compute_type": args.compute_type,
+                  "language": args.language, "without_timestamps": True}
+    writer = ResultWriter(args.output)
+    start_time = time.perf_counter()
+    failed = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(args.threads_per_worker, asr_config, args.ser_backend)) as pool:
+            futures = [pool.submit(analyse_clip, clip, args.streaming_ser_seconds) for clip in clips]
+            for count, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                writer.write(result)
+                if result["error"]:
+                    failed += 1
+                    print(f"[{count}/{len(clips)}] ❌ {result['path']}: {result['error']}")
+                else:
+                    print(f"[{count}/{len(clips)}] {result['path']}: {result['emotion']} "
+                          f"({result['timings']['total']:.1f}s)")
+    finally:
+        writer.close()
+    print(f"Done in {time.perf_counter() - start_time:.0f}s, {failed} failed, results in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
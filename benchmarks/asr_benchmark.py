@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+from pipeline.audio_loading import BUNDLED_CLIPS, SAMPLE_RATE, load_audio
+from pipeline.model_registry import warmup
+from textrecongnition import text_detection
+
+# Compare ASR engine configurations on the bundled clips: real-time factor and word error rate.
+#
+#   python -m benchmarks.asr_benchmark --config whisper:small --config faster-whisper:small:int8 --language en
+#
+# A config is engine:size[:compute_type]. Without --references (a JSON file mapping clip path
+# to reference transcript) the first config's transcripts serve as the reference, so WER is
+# relative to the current engine.
+
+
+def _words(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level Levenshtein distance divided by the reference length."""
+    ref, hyp = _words(reference), _words(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / max(1, len(ref))
+
+
+def run_config(config, clips, options):
+    parts = config.split(":")
+    engine, size = parts[0], parts[1] if len(parts) > 1 else "small"
+    compute_type = parts[2] if len(parts) > 2 else "int8"
+    text_detection.configure_asr(engine, size, compute_type=compute_type, **options)
+    # Load and warm up outside the timed region
+    warmup(text_detection.get_asr_engine().model_key)
+
+    transcripts, elapsed, audio_seconds = {}, 0.0, 0.0
+    for clip, audio in clips.items():
+        start_time = time.perf_counter()
+        transcripts[clip] = text_detection.transcribe_audio(audio)
+        elapsed += time.perf_counter() - start_time
+        audio_seconds += len(audio) / SAMPLE_RATE
+    return {"config": config, "rtf": elapsed / audio_seconds, "seconds": elapsed, "transcripts": transcripts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ASR engines (real-time factor and WER)")
+    parser.add_argument("--config", action="append", help="engine:size[:compute_type], may be repeated")
+    parser.add_argument("--clips", nargs="*", help="audio files (defaults to the bundled clips)")
+    parser.add_argument("--references", help="JSON file mapping clip path to reference transcript")
+    parser.add_argument("--beam-size", type=int)
+    parser.add_argument("--language", help="pin the language, e.g. en")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    configs = args.config or ["whisper:small", "faster-whisper:small:int8"]
+    # Keyed by the path relative to where the benchmark runs, so reference files stay portable
+    clips = {os.path.relpath(clip): load_audio(clip) for clip in (args.clips or BUNDLED_CLIPS)}
+    options = {"beam_size": args.beam_size, "language": args.language, "without_timestamps": True}
+
+    results = [run_config(config, clips, options) for config in configs]
+    references = json.loads(Path(args.references).read_text()) if args.references else results[0]["transcripts"]
+    for result in results:
+        wers = [word_error_rate(references[clip], text) for clip, text in result["transcripts"].items() if clip in references]
+        result["wer"] = sum(wers) / len(wers) if wers else None
+
+    print(f"{'config':32} {'RTF':>8} {'seconds':>9} {'WER':>7}")
+    for result in results:
+        wer = f"{result['wer']:.3f}" if result["wer"] is not None else "-"
+        print(f"{result['config']:32} {result['rtf']:8.3f} {result['seconds']:9.2f} {wer:>7}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# End-to-end latency benchmark: decode -> ASR -> SER -> LLM -> TTS on the bundled recordings.
+#
+#   python -m benchmarks.pipeline_benchmark --iterations 3 --json bench.json
+#   python -m benchmarks.pipeline_benchmark --compare-vad    # ASR/SER time saved by silence trimming
+#
+# The LLM is a deterministic fake chat model and TTS uses the null engine, so the numbers
+# measure this code and the speech models, not Ollama or the network (with a fixed reply,
+# warm TTS numbers are synthesis-cache hits). The first pass runs
+# with nothing loaded (cold); the following passes are warm. The JSON output is meant to be
+# compared between commits.
+
+STAGES = ("decode", "vad", "asr", "ser", "llm", "tts")
+FAKE_REPLY = "That sounds stressful. Let's break it down together. What is the first thing on your list?"
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _timed(fn, *args, **kwargs):
+    start_time = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start_time
+
+
+def run_turn(clip, turn_id):
+    """Run one turn stage by stage and return ({stage: seconds}, audio duration, duration left after VAD)."""
+    from chains import main as chains
+    from emorecognition.emreco import emo_predictor
+    from pipeline.audio_loading import SAMPLE_RATE, load_audio
+    from textrecongnition.text_detection import _vad_trim, transcribe_audio
+    from textrecongnition.text_to_speech import text_to_speech
+
+    timings = {}
+    audio, timings["decode"] = _timed(load_audio, clip)
+    duration = len(audio) / SAMPLE_RATE
+    audio, timings["vad"] = _vad_trim(audio)
+    text, timings["asr"] = _timed(transcribe_audio, audio)
+    emotion_probs, timings["ser"] = _timed(emo_predictor, audio)
+    emotion = max(emotion_probs, key=emotion_probs.get)
+    reply, timings["llm"] = _timed(chains.conversational_rag_chain, {"context": emotion, "input": text}, turn_id)
+    _, timings["tts"] = _timed(text_to_speech, reply, play=False)
+    timings["total"] = sum(timings.values())
+    return timings, duration, len(audio) / SAMPLE_RATE
+
+
+def summarize(samples):
+    values = np.array(samples)
+    return {"p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95)),
+            "mean": float(values.mean()), "n": len(samples)}
+
+
+def run_benchmark(clips, iterations, vad=True):
+    from langchain_core.language_models import FakeListChatModel
+    from chains import main as chains
+    from pipeline.model_registry import unload_all
+    from textrecongnition.text_detection import configure_vad
+    from textrecongnition.text_to_speech import set_tts_engine
+
+    chains.set_llm(FakeListChatModel(responses=[FAKE_REPLY]))
+    set_tts_engine("null")
+    configure_vad(enabled=vad)
+    unload_all()
+
+    cold, _, _ = run_turn(str(clips[0]), "bench-cold")
+    warm = {stage: [] for stage in STAGES + ("total",)}
+    rtf = []
+    kept = []
+    for iteration in range(iterations):
+        for clip in clips:
+            timings, duration, speech_duration = run_turn(str(clip), f"bench-{iteration}")
+            for stage, seconds in timings.items():
+                warm[stage].append(seconds)
+            rtf.append(timings["total"] / duration)
+            kept.append(speech_duration / duration)
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "clips": [os.path.relpath(clip) for clip in clips],
+        "iterations": iterations,
+        "vad": vad,
+        "cold": cold,
+        "warm": {stage: summarize(samples) for stage, samples in warm.items()},
+        "rtf": summarize(rtf),
+        "audio_kept": summarize(kept),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_report(report):
+    print(f"commit {report['commit']}  peak RSS {report['peak_rss_mb']:.0f} MB  "
+          f"RTF p50 {report['rtf']['p50']:.3f} p95 {report['rtf']['p95']:.3f}  "
+          f"audio kept by VAD {report['audio_kept']['mean']:.0%}")
+    print(f"{'stage':8} {'cold s':>8} {'p50 s':>8} {'p95 s':>8}")
+    for stage, stats in report["warm"].items():
+        print(f"{stage:8} {report['cold'][stage]:8.3f} {stats['p50']:8.3f} {stats['p95']:8.3f}")
+
+
+def print_vad_savings(without_vad, with_vad):
+    print("ASR + SER time with and without silence trimming (warm, mean per turn)")
+    for stage in ("asr", "ser"):
+        before, after = without_vad["warm"][stage]["mean"], with_vad["warm"][stage]["mean"]
+        print(f"{stage:8} {before:8.3f} -> {after:8.3f} s  ({1 - after / before:.0%} saved)")
+    print(f"audio passed to the models: {with_vad['audio_kept']['mean']:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark with a per-stage breakdown")
+    parser.add_argument("--clips", nargs="*", help="audio files (defaults to the bundled recordings)")
+    parser.add_argument("--iterations", type=int, default=3, help="warm passes over the clips")
+    parser.add_argument("--json", help="write the machine-readable report to this file")
+    parser.add_argument("--no-vad", action="store_true", help="give the models the untrimmed audio")
+    parser.add_argument("--compare-vad", action="store_true", help="run with and without silence trimming")
+    args = parser.parse_args()
+
+    from pipeline.audio_loading import BUNDLED_CLIPS
+    clips = [Path(clip) for clip in args.clips] if args.clips else BUNDLED_CLIPS
+    if args.compare_vad:
+        reports = {"without_vad": run_benchmark(clips, args.iterations, vad=False),
+                   "with_vad": run_benchmark(clips, args.iterations, vad=True)}
+        for name, report in reports.items():
+            print(name)
+            print_report(report)
+        print_vad_savings(reports["without_vad"], reports["with_vad"])
+    else:
+        reports = run_benchmark(clips, args.iterations, vad=not args.no_vad)
+        print_report(reports)
+    if args.json:
+        Path(args.json).write_text(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
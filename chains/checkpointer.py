@@ -0,0 +1,59 @@
+import sqlite3
+from pathlib import Path
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+CHECKPOINT_DB_PATH = Path("data/user_data/checkpoints.sqlite3")
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """
+    SQLite checkpointer that keeps only the newest max_checkpoints checkpoints per thread.
+
+    Every put prunes the thread's older checkpoints and their pending writes; compact()
+    does the same for all threads and then VACUUMs the file to hand the space back.
+    Checkpoint ids are time-ordered (uuid6), so "newest" is simply the largest id.
+    """
+
+    def __init__(self, conn, max_checkpoints=10, **kwargs):
+        super().__init__(conn, **kwargs)
+        self.max_checkpoints = max_checkpoints
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        configurable = next_config["configurable"]
+        self.prune(configurable["thread_id"], configurable.get("checkpoint_ns", ""))
+        return next_config
+
+    def prune(self, thread_id, checkpoint_ns=""):
+        """Delete all but the newest max_checkpoints checkpoints (and their writes) of a thread."""
+        with self.cursor() as cur:
+            cur.execute(
+                """DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                       SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+                       ORDER BY checkpoint_id DESC LIMIT ?)""",
+                (str(thread_id), checkpoint_ns, str(thread_id), checkpoint_ns, self.max_checkpoints))
+            cur.execute(
+                """DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                       SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)""",
+                (str(thread_id), checkpoint_ns, str(thread_id), checkpoint_ns))
+
+    def compact(self):
+        """Prune every thread and shrink the database file."""
+        with self.cursor(transaction=False) as cur:
+            threads = cur.execute("SELECT DISTINCT thread_id, checkpoint_ns FROM checkpoints").fetchall()
+        for thread_id, checkpoint_ns in threads:
+            self.prune(thread_id, checkpoint_ns)
+        with self.lock:
+            self.conn.execute("VACUUM")
+
+
+def open_sqlite_checkpointer(path=CHECKPOINT_DB_PATH, max_checkpoints=10):
+    """Open (creating if needed) a bounded SQLite checkpointer shared by all threads of the process."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    # SqliteSaver serializes access with its own lock, so one connection can serve every worker thread
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    saver = BoundedSqliteSaver(conn, max_checkpoints=max_checkpoints)
+    saver.setup()
+    return saver
@@ -0,0 +1,106 @@
+from langchain_core.messages import AIMessage, HumanMessage, trim_messages
+
+from chains import history_store
+
+# Token budget for the history part of the prompt; SUMMARY_TOKENS of it go to the rolling summary
+HISTORY_TOKEN_BUDGET = 1500
+SUMMARY_TOKENS = 300
+# Never look further back than this many messages for the verbatim part
+MAX_RECENT_MESSAGES = 200
+# How much old conversation is folded into the summary per LLM call
+SUMMARY_CHUNK_TOKENS = 1500
+
+SUMMARY_PROMPT = """You keep a running summary of the conversations between a student and an assistant that helps them lower their stress.
+Keep what matters for later sessions: what stresses the student, how they felt, what helped and any plans they made.
+Write at most {max_words} words.
+
+Current summary:
+{summary}
+
+New part of the conversation:
+{lines}
+
+Updated summary:"""
+
+
+def count_tokens(messages):
+    """Approximate token count (about 4 characters per token plus a few per message for the chat template)."""
+    return sum(len(message.content) // 4 + 4 for message in messages)
+
+
+def _to_message(row):
+    message_class = HumanMessage if row["type"] == "human" else AIMessage
+    return message_class(row["content"], id=str(row["id"]))
+
+
+def _format(rows):
+    return "\n\n".join(f"{row['type']}: {row['content'].strip()}" for row in rows)
+
+
+def _chunks(rows, max_tokens):
+    chunk, size = [], 0
+    for row in rows:
+        tokens = len(row["content"]) // 4 + 4
+        if chunk and size + tokens > max_tokens:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(row)
+        size += tokens
+    if chunk:
+        yield chunk
+
+
+def update_summary(user_id, before_id, llm=None):
+    """
+    Fold the user's messages older than before_id into their cached summary.
+
+    Only messages added since the last update are sent to the LLM, so the summary is
+    recomputed incrementally and not at all when nothing new has aged out of the window.
+    """
+    summary, upto_id = history_store.get_summary(user_id)
+    new_rows = history_store.messages_after(user_id, upto_id, before_id)
+    if not new_rows:
+        return summary
+
+    if llm is None:
+        from chains.main import llm
+    for chunk in _chunks(new_rows, SUMMARY_CHUNK_TOKENS):
+        prompt = SUMMARY_PROMPT.format(max_words=int(SUMMARY_TOKENS * 0.7),
+                                       summary=summary or "(none yet)", lines=_format(chunk))
+        summary = llm.invoke(prompt).content.strip()
+        # Save after every chunk so an interrupted catch-up resumes where it stopped
+        history_store.save_summary(user_id, summary, chunk[-1]["id"])
+    return summary
+
+
+def build_history_context(user_id, budget=HISTORY_TOKEN_BUDGET, llm=None):
+    """
+    Build the history part of the prompt within a token budget.
+
+    The most recent turns that fit in the budget are kept verbatim; everything older is
+    replaced by the user's cached rolling summary.
+    """
+    rows = history_store.last_messages(user_id, MAX_RECENT_MESSAGES)
+    if not rows:
+        return ""
+
+    recent = trim_messages(
+        [_to_message(row) for row in rows],
+        max_tokens=budget - SUMMARY_TOKENS,
+        token_counter=count_tokens,
+        strategy="last",
+        start_on="human",
+    )
+    kept_ids = {message.id for message in recent}
+    recent_rows = [row for row in rows if str(row["id"]) in kept_ids]
+
+    # Everything before the first verbatim message is covered by the summary
+    first_kept_id = recent_rows[0]["id"] if recent_rows else rows[-1]["id"] + 1
+    summary = update_summary(user_id, first_kept_id, llm)
+
+    parts = []
+    if summary:
+        parts.append(f"Summary of earlier conversations:\n{summary}")
+    if recent_rows:
+        parts.append(f"Recent conversation:\n{_format(recent_rows)}")
+    return "\n\n".join(parts)
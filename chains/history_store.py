@@ -0,0 +1,159 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Append-only conversation history, one row per message, indexed by (user, time)
+DB_PATH = Path("data/user_data/history.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    type TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_user_ts ON messages (user_id, ts, id);
+CREATE TABLE IF NOT EXISTS migrations (
+    source TEXT PRIMARY KEY,
+    migrated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS index_positions (
+    name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    upto_id INTEGER NOT NULL,
+    PRIMARY KEY (name, user_id)
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    user_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    upto_id INTEGER NOT NULL
+);
+"""
+
+_local = threading.local()
+
+
+def _connect():
+    """Return this thread's connection to the history database (sqlite connections are per thread)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        # WAL keeps readers (e.g. a login) from blocking on a turn being appended
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _local.conn, _local.path = conn, DB_PATH
+    return conn
+
+
+def append_turn(user_id, messages, ts=None):
+    """Atomically append a turn's messages ({"type", "content"} dicts) for a user."""
+    ts = time.time() if ts is None else ts
+    conn = _connect()
+    with conn:  # one transaction: either the whole turn is stored or none of it
+        conn.executemany(
+            "INSERT INTO messages (user_id, ts, type, content) VALUES (?, ?, ?, ?)",
+            [(user_id, ts, msg.get("type", "unknown"), msg.get("content", "")) for msg in messages])
+
+
+def append_message(user_id, msg_type, content):
+    append_turn(user_id, [{"type": msg_type, "content": content}])
+
+
+def _rows_to_messages(rows):
+    return [{"id": row["id"], "ts": row["ts"], "type": row["type"], "content": row["content"]} for row in rows]
+
+
+def last_messages(user_id, n=None):
+    """Return the user's last n messages (all of them if n is None), oldest first."""
+    query = "SELECT id, ts, type, content FROM messages WHERE user_id = ? ORDER BY ts DESC, id DESC"
+    params = (user_id,)
+    if n is not None:
+        query += " LIMIT ?"
+        params += (n,)
+    rows = _connect().execute(query, params).fetchall()
+    return _rows_to_messages(reversed(rows))
+
+
+def messages_after(user_id, after_id=0, before_id=None):
+    """Return the user's messages with after_id < id (< before_id, if given), oldest first."""
+    query = "SELECT id, ts, type, content FROM messages WHERE user_id = ? AND id > ?"
+    params = (user_id, after_id)
+    if before_id is not None:
+        query += " AND id < ?"
+        params += (before_id,)
+    rows = _connect().execute(query + " ORDER BY ts, id", params).fetchall()
+    return _rows_to_messages(rows)
+
+
+def get_summary(user_id):
+    """Return (summary, upto_id): the cached summary of the user's messages with id <= upto_id."""
+    row = _connect().execute("SELECT summary, upto_id FROM summaries WHERE user_id = ?", (user_id,)).fetchone()
+    return (row["summary"], row["upto_id"]) if row else ("", 0)
+
+
+def save_summary(user_id, summary, upto_id):
+    conn = _connect()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO summaries (user_id, summary, upto_id) VALUES (?, ?, ?)",
+                     (user_id, summary, upto_id))
+
+
+def message_count(user_id):
+    return _connect().execute("SELECT COUNT(*) FROM messages WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+
+def get_index_position(name, user_id):
+    """Return the last message id a derived index (e.g. the retrieval store) has consumed for a user."""
+    row = _connect().execute("SELECT upto_id FROM index_positions WHERE name = ? AND user_id = ?",
+                             (name, user_id)).fetchone()
+    return row["upto_id"] if row else 0
+
+
+def set_index_position(name, user_id, upto_id):
+    conn = _connect()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO index_positions (name, user_id, upto_id) VALUES (?, ?, ?)",
+                     (name, user_id, upto_id))
+
+
+def migrate_json_files(data_dir):
+    """
+    One-shot import of the old per-user <user>.json files into the store.
+
+    Every file is imported once (tracked in the migrations table by file name, so moving or
+    re-cloning the checkout does not import it again) and left untouched on disk. Messages keep
+    their order and are timestamped just before the user's oldest stored message, as they
+    predate everything in the store. Entries without content are skipped.
+    """
+    conn = _connect()
+    # Older versions keyed migrations on the absolute path; compare on the file name only
+    done = {Path(row["source"]).name for row in conn.execute("SELECT source FROM migrations")}
+    migrated = 0
+    for user_file in sorted(Path(data_dir).glob("*.json")):
+        if user_file.name in done:
+            continue
+        try:
+            with open(user_file, "r", encoding="utf-8") as f:
+                messages = json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"❌ Skipping {user_file} during migration: {e}")
+            continue
+
+        rows = [(msg.get("type", "unknown"), msg["content"]) for msg in messages
+                if isinstance(msg, dict) and msg.get("content") is not None]
+        with conn:
+            oldest = conn.execute("SELECT MIN(ts) FROM messages WHERE user_id = ?", (user_file.stem,)).fetchone()[0]
+            # One timestamp for the whole file; ORDER BY ts, id keeps the file's order
+            ts = (time.time() if oldest is None else oldest) - 1
+            conn.executemany(
+                "INSERT INTO messages (user_id, ts, type, content) VALUES (?, ?, ?, ?)",
+                [(user_file.stem, ts, msg_type, content) for msg_type, content in rows])
+            conn.execute("INSERT INTO migrations (source, migrated_at) VALUES (?, ?)", (user_file.name, time.time()))
+        migrated += 1
+        print(f"Migrated {len(rows)} messages for user: {user_file.stem}")
+    return migrated
@@ -1,11 +1,10 @@
 from typing import Annotated
 from typing import Sequence
-import io
-import sys
+import os
 from langchain_ollama import ChatOllama
 import json
 from pathlib import Path
-from langchain_core.messages import HumanMessage,AIMessage,SystemMessage
+from langchain_core.messages import HumanMessage,AIMessage,AIMessageChunk,SystemMessage,RemoveMessage
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import START, MessagesState, StateGraph
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -13,18 +12,30 @@ from typing_extensions import Annotated, TypedDict
 from langchain_core.messages import BaseMessage
 from langgraph.graph.message import add_messages
 from langchain_core.messages import SystemMessage, trim_messages
+from chains.context_builder import count_tokens
+from pipeline.tracing import record, span, tracing_enabled
 
 llm = ChatOllama(
     model="llama3.2",
     temperature=0,
+    # Point OLLAMA_BASE_URL at another Ollama (or a local stand-in) if it is not on localhost:11434
+    base_url=os.environ.get("OLLAMA_BASE_URL"),
 )
 
+
+def set_llm(chat_model):
+    """Swap the chat model used by the graph (e.g. a fake model for tests or benchmarks)."""
+    global llm
+    llm = chat_model
+
 messages_store = {}
+# Upper bound on the messages kept in a conversation thread's state
+MAX_THREAD_MESSAGES = 40
 prompt_template = ChatPromptTemplate.from_messages(
     [
         (
             "system",
-            "You are trying to lower student stress level to the best of your ability. Student is feeling {language}.",
+            "You are trying to lower student stress level to the best of your ability. Student is feeling {language}.{history}",
         ),
         MessagesPlaceholder(variable_name="messages"),
     ]
@@ -34,12 +45,37 @@ workflow = StateGraph(state_schema=MessagesState)
 
 
 # Define the function that calls the model
-def call_model(state: MessagesState):
-    prompt = prompt_template.invoke(
-        {"messages": state["messages"], "language": state.get("language", "en")} # , "language": state["language"]
-    )
-    response = llm.invoke(prompt)
-    return {"messages": response}
+def call_model(state: MessagesState, config):
+    messages = state["messages"]
+    # Context retrieved for this call only; it goes into the system prompt and never into messages,
+    # so the checkpointed thread does not grow with it
+    history = config.get("configurable", {}).get("history") or ""
+    if history:
+        history = "\n\nRelevant parts of earlier conversations with the student:\n" + history
+    with span("prompt_build", messages=len(messages)):
+        prompt = prompt_template.invoke(
+            {"messages": messages, "language": state.get("language", "en"), "history": history} # , "language": state["language"]
+        )
+    model = getattr(llm, "model", type(llm).__name__)
+    with span("llm", model=model):
+        response = llm.invoke(prompt)
+    if tracing_enabled():
+        _record_llm_phases(model, prompt, response)
+    # Keep the thread bounded: drop the oldest messages beyond MAX_THREAD_MESSAGES
+    overflow = max(0, len(messages) + 1 - MAX_THREAD_MESSAGES)
+    removed = [RemoveMessage(id=message.id) for message in messages[:overflow]]
+    return {"messages": removed + [response]}
+
+
+def _record_llm_phases(model, prompt, response):
+    # Ollama reports prompt evaluation (prefill) and generation times in nanoseconds
+    metadata = getattr(response, "response_metadata", None) or {}
+    prompt_tokens = metadata.get("prompt_eval_count") or count_tokens(prompt.to_messages())
+    if metadata.get("prompt_eval_duration") is not None:
+        record("llm_prefill", metadata["prompt_eval_duration"] / 1e9, model=model, prompt_tokens=prompt_tokens)
+    if metadata.get("eval_duration") is not None:
+        record("llm_generation", metadata["eval_duration"] / 1e9, model=model,
+               output_tokens=metadata.get("eval_count"))
 
 
 # Define the (single) node in the graph
@@ -50,6 +86,30 @@ workflow.add_node("model", call_model)
 memory = MemorySaver()
 app = workflow.compile(checkpointer=memory)
 
+
+def use_sqlite_checkpointer(path=None, max_checkpoints=10):
+    """Recompile the graph with a persistent, bounded SQLite checkpointer instead of MemorySaver."""
+    global memory, app
+    from chains.checkpointer import CHECKPOINT_DB_PATH, open_sqlite_checkpointer
+    memory = open_sqlite_checkpointer(path or CHECKPOINT_DB_PATH, max_checkpoints=max_checkpoints)
+    app = workflow.compile(checkpointer=memory)
+    return memory
+
+
+def keep_alive_ping(keep_alive="30m"):
+    """Ask Ollama to load the chat model now and keep it in memory, so the first turn skips the model load."""
+    model = getattr(llm, "model", None)
+    if model is None:
+        return  # not an Ollama model (e.g. a fake one set with set_llm)
+    import ollama
+    ollama.Client(host=os.environ.get("OLLAMA_BASE_URL")).generate(model=model, prompt="", keep_alive=keep_alive)
+
+
+def has_thread_state(id):
+    """True if the conversation thread already has messages (e.g. restored from the SQLite checkpointer)."""
+    state = app.get_state({"configurable": {"thread_id": id}})
+    return bool(state.values.get("messages"))
+
 # def store_init_2(user_id: str, initial_messages: list, config_id: int):
 #     """
 #     Store initial messages for a user globally and in LangGraph memory as a checkpoint.
@@ -229,7 +289,8 @@ class MessagesState(TypedDict):
 
 
 def conversational_rag_chain(input, id):
-    config = {"configurable": {"thread_id": id}}
+    # input["history"] (optional) is context for this turn only, see call_model
+    config = {"configurable": {"thread_id": id, "history": input.get("history", "")}}
     query = input["input"]
     lang = input["context"]
     input_messages = [HumanMessage(query)]
@@ -238,14 +299,23 @@ def conversational_rag_chain(input, id):
         "messages": input_messages, "language": lang},
         config)
 
-    # Capture the pretty-printed output
-    buffer = io.StringIO()
-    sys.stdout = buffer  # Redirect stdout to the buffer
-    output["messages"][-1].pretty_print()
-    sys.stdout = sys.__stdout__  # Reset stdout to normal
+    # Read the reply off the message; redirecting sys.stdout to capture pretty_print() is
+    # process-wide and mixes up replies when several turns run at once (e.g. in server.py)
+    return output["messages"][-1].content
+
+
+def conversational_rag_chain_stream(input, id):
+    """Same as conversational_rag_chain, but yields the reply token by token as the LLM produces it."""
+    config = {"configurable": {"thread_id": id, "history": input.get("history", "")}}
+    input_messages = [HumanMessage(input["input"])]
 
-    pretty_output = buffer.getvalue()  # Get the captured output as a string
-    return pretty_output
+    # "messages" mode streams the chunks of the llm.invoke call inside call_model
+    for chunk, metadata in app.stream(
+            {"messages": input_messages, "language": input["context"]},
+            config,
+            stream_mode="messages"):
+        if isinstance(chunk, AIMessageChunk) and chunk.content:
+            yield chunk.content
 
 
 if __name__ == "__main__":
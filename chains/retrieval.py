@@ -0,0 +1,92 @@
+import hashlib
+import threading
+
+from langchain_chroma import Chroma
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from chains import history_store
+from pipeline.model_registry import register_model, get_model, use_models
+
+# On-disk vector index of every user's past exchanges
+VECTOR_STORE_DIR = "data/vector_store"
+EMBEDDING_MODEL = "embeddings"
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+TOP_K = 4
+
+_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+_stores = {}
+_lock = threading.Lock()
+
+
+def _load_embeddings():
+    # A small sentence-transformers model; fast enough on CPU to embed every turn
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME, model_kwargs={"device": "cpu"},
+                                 encode_kwargs={"normalize_embeddings": True})
+
+
+register_model(EMBEDDING_MODEL, _load_embeddings, warmup=lambda embeddings: embeddings.embed_query("warmup"))
+use_models("retrieval", EMBEDDING_MODEL)
+
+
+def _get_store(user_id):
+    with _lock:
+        store = _stores.get(user_id)
+        if store is None:
+            # Chroma collection names are restricted, so the user id is hashed
+            name = "history_" + hashlib.sha1(str(user_id).encode("utf-8")).hexdigest()[:16]
+            store = Chroma(collection_name=name, embedding_function=get_model(EMBEDDING_MODEL),
+                           persist_directory=VECTOR_STORE_DIR)
+            _stores[user_id] = store
+        return store
+
+
+def _exchanges(rows):
+    """Group messages into human -> ai exchanges; a trailing unanswered message is left for later."""
+    exchange = []
+    for row in rows:
+        if row["type"] == "human" and any(msg["type"] != "human" for msg in exchange):
+            yield exchange
+            exchange = []
+        exchange.append(row)
+    if exchange and exchange[-1]["type"] != "human":
+        yield exchange
+
+
+def update_index(user_id):
+    """Embed the user's exchanges that were added since the last update."""
+    position = history_store.get_index_position("retrieval", user_id)
+    rows = history_store.messages_after(user_id, position)
+    documents, ids = [], []
+    last_id = position
+    for exchange in _exchanges(rows):
+        text = "\n".join(f"{row['type']}: {row['content'].strip()}" for row in exchange)
+        metadata = {"first_id": exchange[0]["id"], "ts": exchange[0]["ts"]}
+        for i, chunk in enumerate(_splitter.split_text(text)):
+            documents.append(Document(page_content=chunk, metadata=metadata))
+            # Stable ids make a re-run after a crash overwrite instead of duplicate
+            ids.append(f"{exchange[0]['id']}-{i}")
+        last_id = exchange[-1]["id"]
+
+    if documents:
+        _get_store(user_id).add_documents(documents, ids=ids)
+    if last_id != position:
+        history_store.set_index_position("retrieval", user_id, last_id)
+    return len(documents)
+
+
+def retrieve_context(user_id, query, k=TOP_K, before_ts=None):
+    """
+    Return the k past exchanges most relevant to query, formatted for the prompt.
+
+    before_ts restricts the search to exchanges older than the current session, whose
+    turns are already part of the conversation state.
+    """
+    update_index(user_id)
+    search_filter = {"ts": {"$lt": before_ts}} if before_ts is not None else None
+    documents = _get_store(user_id).similarity_search(query, k=k, filter=search_filter)
+    if not documents:
+        return ""
+    documents.sort(key=lambda document: document.metadata["first_id"])
+    return "Relevant past exchanges:\n" + "\n\n".join(document.page_content for document in documents)
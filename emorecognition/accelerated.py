@@ -0,0 +1,126 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import torch
+from transformers import AutoConfig
+
+from emorecognition.emreco import (SER_BACKENDS, SER_MODEL_NAME, _load_normalized, _predict_probs,
+                                   load_ser_model, warmup_ser_model)
+from pipeline.audio_loading import BUNDLED_CLIPS, load_audio
+from pipeline.model_registry import get_model, register_model
+
+# Accelerated CPU backends for the WavLM emotion classifier:
+#   int8       - torch dynamic quantization of the Linear layers, applied at load time
+#   onnx       - a one-time ONNX export run with ONNX Runtime
+#   onnx-int8  - the ONNX export with dynamically quantized int8 weights
+# Exports are cached in MODEL_CACHE_DIR and redone when the hub revision or torch version changes.
+
+MODEL_CACHE_DIR = Path("data/model_cache")
+ONNX_PATH = MODEL_CACHE_DIR / "ser.onnx"
+ONNX_INT8_PATH = MODEL_CACHE_DIR / "ser.int8.onnx"
+FINGERPRINT_PATH = MODEL_CACHE_DIR / "ser.onnx.json"
+
+
+def load_int8_model():
+    model = load_ser_model().eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _fingerprint(config):
+    return {"model": SER_MODEL_NAME, "revision": getattr(config, "_commit_hash", None), "torch": torch.__version__}
+
+
+def export_onnx(force=False):
+    """Export the classifier to ONNX (plus an int8-weight copy) unless an up-to-date export is cached."""
+    config = AutoConfig.from_pretrained(SER_MODEL_NAME, trust_remote_code=True)
+    fingerprint = _fingerprint(config)
+    if not force and ONNX_PATH.exists() and ONNX_INT8_PATH.exists() and FINGERPRINT_PATH.exists():
+        if json.loads(FINGERPRINT_PATH.read_text()) == fingerprint:
+            return ONNX_PATH
+
+    MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    model = load_ser_model().eval()
+    wavs = torch.randn(2, config.sampling_rate * 2)
+    mask = torch.ones_like(wavs)
+    print(f"Exporting {SER_MODEL_NAME} to {ONNX_PATH}")
+    torch.onnx.export(
+        model, (wavs, mask), str(ONNX_PATH),
+        input_names=["wavs", "mask"], output_names=["logits"],
+        dynamic_axes={"wavs": {0: "batch", 1: "samples"}, "mask": {0: "batch", 1: "samples"},
+                      "logits": {0: "batch"}},
+        opset_version=17)
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(str(ONNX_PATH), str(ONNX_INT8_PATH), weight_type=QuantType.QInt8)
+    # Written last, so an interrupted export is redone next time
+    FINGERPRINT_PATH.write_text(json.dumps(fingerprint))
+    return ONNX_PATH
+
+
+class OnnxSerModel:
+    """The exported classifier run by ONNX Runtime, behind the same model(wavs, mask) call as the torch model."""
+
+    def __init__(self, path, config):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise RuntimeError("The ONNX SER backend needs onnxruntime (pip install onnx onnxruntime)") from e
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.config = config
+
+    def __call__(self, wavs, mask):
+        logits = self.session.run(["logits"], {"wavs": wavs.numpy(), "mask": mask.numpy()})[0]
+        return torch.from_numpy(logits)
+
+
+def _onnx_loader(path):
+    def load():
+        export_onnx()
+        return OnnxSerModel(path, AutoConfig.from_pretrained(SER_MODEL_NAME, trust_remote_code=True))
+    return load
+
+
+register_model(SER_BACKENDS["int8"], load_int8_model, warmup=warmup_ser_model)
+register_model(SER_BACKENDS["onnx"], _onnx_loader(ONNX_PATH), warmup=warmup_ser_model)
+register_model(SER_BACKENDS["onnx-int8"], _onnx_loader(ONNX_INT8_PATH), warmup=warmup_ser_model)
+
+
+def parity_check(backend, clips=BUNDLED_CLIPS, tolerance=0.05):
+    """
+    Compare a backend's emotion distribution with the full-precision torch model on the given clips.
+
+    Passes if, on every clip, no probability differs by more than tolerance and the most
+    likely label is the same. Prints one line per clip and returns True/False.
+    """
+    reference = get_model(SER_BACKENDS["torch"])
+    candidate = get_model(SER_BACKENDS[backend])
+    passed = True
+    for clip in clips:
+        audio = load_audio(clip, sr=reference.config.sampling_rate)
+        expected = _predict_probs(reference, _load_normalized(audio, reference))
+        actual = _predict_probs(candidate, _load_normalized(audio, candidate))
+        max_diff = float(np.max(np.abs(expected - actual)))
+        same_label = int(np.argmax(expected)) == int(np.argmax(actual))
+        ok = max_diff <= tolerance and same_label
+        passed = passed and ok
+        print(f"{'ok  ' if ok else 'FAIL'} {clip}: max |p - p_ref| = {max_diff:.4f}, same top label: {same_label}")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export accelerated SER backends and check them against the torch model")
+    parser.add_argument("command", choices=["export", "parity"])
+    parser.add_argument("--backend", choices=[b for b in SER_BACKENDS if b != "torch"], default="int8")
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    parser.add_argument("--force", action="store_true", help="re-export even if the cached export is up to date")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx(force=args.force)
+    else:
+        sys.exit(0 if parity_check(args.backend, tolerance=args.tolerance) else 1)
@@ -1,46 +1,85 @@
-from transformers import AutoModelForAudioClassification
-import librosa, torch
-from pydub import AudioSegment
-import io
+from transformers import AutoConfig, AutoModelForAudioClassification
+import torch
+import numpy as np
+import os
 import time
 import warnings
 
+from pipeline.audio_loading import SAMPLE_RATE, iter_audio_blocks, load_audio
+from pipeline.model_registry import register_model, get_model, use_models
+from pipeline.result_cache import cached_result
+from pipeline.tracing import span
 
-def convert_audio_to_wav(audio_path):
-    """Convert non-WAV audio files (e.g., .m4a) to a WAV format in-memory for librosa processing."""
-    if audio_path.endswith(".wav"):
-        return audio_path  # Already WAV, no need to convert
+SER_MODEL = "ser"
+SER_MODEL_NAME = "3loi/SER-Odyssey-Baseline-WavLM-Categorical-Attributes"
 
-    # Load audio and convert to WAV
-    audio = AudioSegment.from_file(audio_path)
-    
-    # Use an in-memory buffer instead of saving to a file
-    wav_buffer = io.BytesIO()
-    audio.export(wav_buffer, format="wav")
-    
-    # Reset buffer position for reading
-    wav_buffer.seek(0)
-    
-    return wav_buffer  # Now this is an in-memory WAV file
 
+def load_ser_model():
+    """Load the WavLM emotion classifier from the Hugging Face hub (or local cache)."""
+    return AutoModelForAudioClassification.from_pretrained(SER_MODEL_NAME, trust_remote_code=True)
 
-def emo_predictor(audio_path):
-    # Load model
-    model = AutoModelForAudioClassification.from_pretrained("3loi/SER-Odyssey-Baseline-WavLM-Categorical-Attributes", trust_remote_code=True)
 
-    # Get mean/std
-    mean = model.config.mean
-    std = model.config.std
-    
-    # Check if the audio is already in WAV format
-    audio_path = convert_audio_to_wav(audio_path)
-    
-    # Load the audio into librosa
-    raw_wav, _ = librosa.load(audio_path, sr=model.config.sampling_rate)
-    
+def warmup_ser_model(model):
+    """Run one dummy forward pass so the first real utterance does not pay for lazy init."""
+    wavs = torch.zeros(1, model.config.sampling_rate)
+    with torch.no_grad():
+        model(wavs, torch.ones_like(wavs))
+
+
+register_model(SER_MODEL, load_ser_model, warmup=warmup_ser_model)
+
+# Inference backends for the classifier and the registry model each one uses.
+# The accelerated ones are registered by emorecognition.accelerated.
+SER_BACKENDS = {
+    "torch": SER_MODEL,
+    "int8": "ser-int8",
+    "onnx": "ser-onnx",
+    "onnx-int8": "ser-onnx-int8",
+}
+_ser_backend = "torch"
+use_models("ser", SER_MODEL)
+# backend -> hub revision of its classifier, see ser_model_version
+_ser_versions = {}
+
+
+def _check_backend(backend):
+    if backend not in SER_BACKENDS:
+        raise ValueError(f"Unknown SER backend '{backend}', expected one of {list(SER_BACKENDS)}")
+    if backend != "torch":
+        import emorecognition.accelerated  # registers the accelerated models
+
+
+def set_ser_backend(backend):
+    """Switch the emotion classifier between full-precision torch, int8 torch and ONNX Runtime."""
+    global _ser_backend
+    _check_backend(backend)
+    _ser_backend = backend
+    use_models("ser", SER_BACKENDS[backend])
+
+
+def get_ser_model(backend=None):
+    """Return the classifier for the given (or selected) backend, loaded once through the model registry."""
+    if backend is not None:
+        _check_backend(backend)
+    return get_model(SER_BACKENDS[backend or _ser_backend])
+
+
+def _load_normalized(audio, model):
+    """Load a file (or take an array at the model's sampling rate) and normalize it by mean/std."""
+    # Decoding and resampling happen once in load_audio; arrays pass straight through
+    raw_wav = load_audio(audio, sr=model.config.sampling_rate)
+
     # Normalize the audio by mean/std
-    norm_wav = (raw_wav - mean) / (std+0.000001)
-    
+    return (raw_wav - model.config.mean) / (model.config.std+0.000001)
+
+
+def _to_emotion_dict(probabilities, model):
+    # Convert to dictionary format
+    id2label = model.config.id2label
+    return {id2label[i]: float(probabilities[i]) for i in range(len(probabilities))}
+
+
+def _predict_probs(model, norm_wav):
     # Generate the mask
     mask = torch.ones(1, len(norm_wav))
     
@@ -52,13 +91,145 @@ def emo_predictor(audio_path):
         pred = model(wavs, mask)
         
     # Convert logits to probability
-    probabilities = torch.nn.functional.softmax(pred, dim=1).squeeze().numpy()
-       
-    # Convert to dictionary format
-    id2label = model.config.id2label
-    emotion_probs = {id2label[i]: probabilities[i] for i in range(len(probabilities))}
+    return torch.nn.functional.softmax(pred, dim=1).squeeze().numpy()
+
+
+def ser_model_version(backend=None):
+    """
+    The hub revision of the classifier behind a backend (None if unknown, which disables result caching).
+
+    It is read from the model's config (a small file) and memoized, so a result cache hit never
+    has to load WavLM.
+    """
+    backend = backend or _ser_backend
+    if backend not in _ser_versions:
+        config = AutoConfig.from_pretrained(SER_MODEL_NAME, trust_remote_code=True)
+        _ser_versions[backend] = getattr(config, "_commit_hash", None)
+    return _ser_versions[backend]
+
+
+def emo_predictor(audio_path, backend=None):
+    backend = backend or _ser_backend
+    _check_backend(backend)
+    # Decode first: the result cache (if enabled) is keyed on the decoded samples
+    audio = load_audio(audio_path, sr=SAMPLE_RATE)
+    # The shared model for the backend (loaded once per process) is only needed on a cache miss
+    return cached_result("ser", audio, SER_BACKENDS[backend], ser_model_version(backend),
+                         lambda: _emo_predict(audio, get_ser_model(backend), backend))
+
+
+def _emo_predict(audio, model, backend):
+    norm_wav = _load_normalized(audio, model)
+    with span("ser", model=SER_BACKENDS[backend],
+              audio_seconds=len(norm_wav) / model.config.sampling_rate):
+        probabilities = _predict_probs(model, norm_wav)
+
+    return _to_emotion_dict(probabilities, model)
+
+
+def _length_batches(lengths, max_samples):
+    """Group clip indices by length so that every padded batch stays under max_samples."""
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches, current = [], []
+    for i in order:
+        # Clips come in increasing length, so the clip being added sets the padded width
+        if current and lengths[i] * (len(current) + 1) > max_samples:
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def emo_predict_batch(paths_or_arrays, max_batch_seconds=60.0):
+    """
+    Predict emotion probabilities for many clips with padded, length-grouped forward passes.
+
+    Clips are sorted by length and packed into batches whose padded size stays under
+    max_batch_seconds of audio (a longer clip gets a batch of its own). Padding is masked
+    out, so each result matches emo_predictor on the same clip up to float tolerance.
+    Returns one probability dict per clip, in input order.
+    """
+    model = get_ser_model()
+    norm_wavs = [_load_normalized(audio, model) for audio in paths_or_arrays]
+    lengths = [len(wav) for wav in norm_wavs]
+    max_samples = int(max_batch_seconds * model.config.sampling_rate)
+
+    results = [None] * len(norm_wavs)
+    for batch in _length_batches(lengths, max_samples):
+        width = max(lengths[i] for i in batch)
+        wavs = torch.zeros(len(batch), width)
+        mask = torch.zeros(len(batch), width)
+        for row, i in enumerate(batch):
+            wavs[row, :lengths[i]] = torch.from_numpy(np.asarray(norm_wavs[i], dtype=np.float32))
+            mask[row, :lengths[i]] = 1
+
+        with span("ser_batch", model=SER_BACKENDS[_ser_backend], clips=len(batch),
+                  audio_seconds=sum(lengths[i] for i in batch) / model.config.sampling_rate):
+            with torch.no_grad():
+                pred = model(wavs, mask)
+        probabilities = torch.nn.functional.softmax(pred, dim=1).numpy()
+
+        for row, i in enumerate(batch):
+            results[i] = _to_emotion_dict(probabilities[row], model)
+    return results
+
+def iter_emo_windows(audio, window_seconds=8.0, hop_seconds=4.0, min_window_seconds=1.0):
+    """
+    Yield (start_seconds, end_seconds, probabilities) for overlapping windows over the audio.
+
+    audio is a file path or a 16 kHz array. Files are streamed block by block, so only
+    one window of samples (and one WavLM forward pass on it) is held in memory at a time.
+    A trailing partial window is scored if it is at least min_window_seconds long.
+    """
+    model = get_ser_model()
+    sr = model.config.sampling_rate
+    window = int(window_seconds * sr)
+    hop = int(hop_seconds * sr)
+    if hop <= 0:
+        # A zero hop never moves the window forward
+        raise ValueError(f"hop_seconds must be positive, got {hop_seconds}")
+    normalize = lambda wav: (wav - model.config.mean) / (model.config.std+0.000001)
+
+    buffer = np.zeros(0, dtype=np.float32)
+    offset = 0  # sample index of buffer[0] in the whole recording
+    scored_any = False
+    for block in iter_audio_blocks(audio, hop, sr):
+        buffer = np.concatenate([buffer, block])
+        while len(buffer) >= window:
+            yield offset / sr, (offset + window) / sr, _predict_probs(model, normalize(buffer[:window]))
+            buffer = buffer[hop:]
+            offset += hop
+            scored_any = True
+
+    # The tail holds new audio only if it reaches past the end of the last full window
+    has_new_audio = len(buffer) > window - hop if scored_any else len(buffer) > 0
+    if has_new_audio and (len(buffer) >= min_window_seconds * sr or not scored_any):
+        yield offset / sr, (offset + len(buffer)) / sr, _predict_probs(model, normalize(buffer))
+
+
+def emo_predict_streaming(audio, window_seconds=8.0, hop_seconds=4.0, min_window_seconds=1.0):
+    """
+    Score a long recording with sliding windows.
+
+    Returns {"windows": [{"start", "end", "emotions"}, ...], "emotions": {...}} where the
+    utterance-level distribution is the duration-weighted mean of the window probabilities.
+    """
+    model = get_ser_model()
+    windows = []
+    total, total_weight = None, 0.0
+    for start, end, probabilities in iter_emo_windows(audio, window_seconds, hop_seconds, min_window_seconds):
+        windows.append({"start": start, "end": end, "emotions": _to_emotion_dict(probabilities, model)})
+        weight = end - start
+        total = probabilities * weight if total is None else total + probabilities * weight
+        total_weight += weight
+
+    emotions = _to_emotion_dict(total / total_weight, model) if windows else {}
+    return {"windows": windows, "emotions": emotions}
 
-    return emotion_probs
+if os.environ.get("SER_BACKEND"):
+    set_ser_backend(os.environ["SER_BACKEND"])
 
 if __name__ == '__main__':
     warnings.filterwarnings("ignore")
@@ -0,0 +1,112 @@
+import io
+import subprocess
+import tempfile
+from pathlib import Path
+
+import librosa
+import numpy as np
+import soundfile
+from pydub import AudioSegment
+
+from pipeline.tracing import span
+
+# Both Whisper and the WavLM classifier expect 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+# The recordings shipped with the repo, used by the tests, benchmarks and the SER parity check
+_REPO_ROOT = Path(__file__).resolve().parent.parent
+BUNDLED_CLIPS = sorted((_REPO_ROOT / "data/audio_examples").glob("*.m4a")) + \
+    sorted((_REPO_ROOT / "emorecognition/m4atestfolder").glob("*.m4a"))
+
+
+def _to_mono(audio):
+    if audio.ndim == 1:
+        return audio
+    if audio.shape[1] == 1:
+        return audio.reshape(-1)  # A view, not a copy
+    return audio.mean(axis=1)
+
+
+def decode_audio(audio_path):
+    """Decode an audio file to a mono float32 array at its native sampling rate."""
+    if audio_path.endswith(".wav"):
+        audio, sr = soundfile.read(audio_path, dtype="float32", always_2d=True)
+        return _to_mono(audio), sr
+
+    # Anything else (m4a, mp3, ...) goes through ffmpeg via pydub, straight into numpy
+    return _segment_to_array(AudioSegment.from_file(audio_path))
+
+
+def _segment_to_array(segment):
+    segment = segment.set_channels(1)
+    samples = np.array(segment.get_array_of_samples(), dtype=np.float32)
+    samples /= float(1 << (8 * segment.sample_width - 1))
+    return samples, segment.frame_rate
+
+
+def load_audio_bytes(data, sr=SAMPLE_RATE):
+    """Decode an encoded audio file held in memory (wav, m4a, mp3, ...) to a mono float32 array at sr."""
+    with span("decode") as decode_span:
+        audio, native_sr = _segment_to_array(AudioSegment.from_file(io.BytesIO(data)))
+        decode_span.set_tag("audio_seconds", len(audio) / native_sr)
+    if native_sr != sr:
+        with span("resample", audio_seconds=len(audio) / native_sr):
+            audio = librosa.resample(audio, orig_sr=native_sr, target_sr=sr)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def load_audio(source, sr=SAMPLE_RATE):
+    """
+    Return source as a mono float32 array at sr.
+
+    source is a file path or an array that is already at sr. Float32 arrays are passed
+    through without a copy, so one decoded buffer can be shared by ASR and emotion recognition.
+    """
+    if isinstance(source, np.ndarray):
+        return _to_mono(np.asarray(source, dtype=np.float32))
+
+    with span("decode") as decode_span:
+        audio, native_sr = decode_audio(str(source))
+        decode_span.set_tag("audio_seconds", len(audio) / native_sr)
+    if native_sr != sr:
+        with span("resample", audio_seconds=len(audio) / native_sr):
+            audio = librosa.resample(audio, orig_sr=native_sr, target_sr=sr)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def iter_audio_blocks(source, block_size, sr=SAMPLE_RATE):
+    """
+    Yield consecutive mono float32 blocks of at most block_size samples at sr.
+
+    Files are streamed through ffmpeg instead of being decoded in one go, so memory stays
+    bounded by one block however long the recording is. Arrays are yielded as views.
+    """
+    if isinstance(source, np.ndarray):
+        audio = load_audio(source)
+        for start in range(0, len(audio), block_size):
+            yield audio[start:start + block_size]
+        return
+
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", str(source),
+           "-f", "s16le", "-ac", "1", "-ar", str(sr), "-"]
+    # stderr goes to a temp file so a chatty ffmpeg can never block on a full pipe
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+        finished = False
+        try:
+            while True:
+                data = process.stdout.read(block_size * 2)
+                if not data:
+                    break
+                yield np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+            finished = True
+        finally:
+            process.stdout.close()
+            if process.poll() is None:
+                process.kill()
+            returncode = process.wait()
+        # A missing or corrupt file just ends the stream early; don't pass that off as success
+        if finished and returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode("utf-8", "replace").strip()[-500:]
+            raise RuntimeError(f"ffmpeg failed to decode {source} (exit code {returncode}): {message}")
@@ -0,0 +1,126 @@
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class _Request:
+    __slots__ = ("audio", "future", "enqueued_at")
+
+    def __init__(self, audio):
+        self.audio = audio
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """
+    Collect inference requests from concurrent callers and run them as one padded batch.
+
+    A batch is dispatched max_wait_ms after its first request arrived (taking along everything
+    already queued by then), or earlier once it holds max_batch_size clips or the next clip
+    would push it past max_batch_seconds of audio.
+    batch_fn takes a list of 16 kHz arrays and returns one result per array; every caller
+    gets its own result back through the Future returned by submit(). initializer, if given,
+    runs once on the batcher thread (e.g. to set its torch thread count).
+    """
+
+    def __init__(self, batch_fn, name, max_wait_ms=10, max_batch_seconds=60.0, max_batch_size=8, sr=16000,
+                 initializer=None):
+        self.batch_fn = batch_fn
+        self.initializer = initializer
+        self.name = name
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_samples = int(max_batch_seconds * sr)
+        self.max_batch_size = max_batch_size
+
+        self._queue = queue.Queue()
+        self._metrics_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._batch_sizes = collections.Counter()
+        self._max_queue_depth = 0
+        self._queue_wait_total = 0.0
+        self._thread = threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, audio):
+        """Queue one clip and return a Future for its result."""
+        request = _Request(audio)
+        self._queue.put(request)
+        with self._metrics_lock:
+            self._requests += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return request.future
+
+    def __call__(self, audio):
+        return self.submit(audio).result()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def metrics(self):
+        with self._metrics_lock:
+            batched = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                "requests": self._requests,
+                "batches": self._batches,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "mean_batch_size": batched / max(1, self._batches),
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+                "mean_queue_wait_ms": 1000 * self._queue_wait_total / max(1, batched),
+            }
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        if self.initializer:
+            self.initializer()
+        carry = None
+        stopping = False
+        while not stopping:
+            first = carry or self._queue.get()
+            carry = None
+            if first is None:
+                break
+
+            batch, samples = [first], len(first.audio)
+            deadline = first.enqueued_at + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    # Past the deadline (e.g. the head queued while the previous batch ran) nothing more
+                    # is waited for, but whatever is already queued still joins the batch
+                    request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                if samples + len(request.audio) > self.max_batch_samples:
+                    carry = request  # starts the next batch
+                    break
+                batch.append(request)
+                samples += len(request.audio)
+
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        now = time.monotonic()
+        with self._metrics_lock:
+            self._batches += 1
+            self._batch_sizes[len(batch)] += 1
+            self._queue_wait_total += sum(now - request.enqueued_at for request in batch)
+        try:
+            results = self.batch_fn([request.audio for request in batch])
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
@@ -0,0 +1,61 @@
+import os
+import time
+import wave
+
+import numpy as np
+
+# Microphone capture straight into memory. The sounddevice callback appends each block to a
+# preallocated float32 buffer and the finished recording goes to the models as an array,
+# with no temp WAV and no int16 round-trip in between.
+
+
+class CaptureBuffer:
+    """
+    A growable mono float32 buffer for one recording.
+
+    Room for initial_seconds is allocated up front and the buffer doubles when it fills up,
+    so appending a block is a copy into free space and not a new array per block.
+    """
+
+    def __init__(self, sr=16000, initial_seconds=30):
+        self.sr = sr
+        self._data = np.empty(int(sr * initial_seconds), dtype=np.float32)
+        self._length = 0
+
+    def append(self, block):
+        """Copy a (frames,) or (frames, channels) block in and return a view of the new samples."""
+        block = np.asarray(block, dtype=np.float32)
+        if block.ndim == 2:
+            block = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1)
+        end = self._length + len(block)
+        if end > len(self._data):
+            # Views returned earlier keep pointing at the old array, whose samples never change
+            grown = np.empty(max(end, 2 * len(self._data)), dtype=np.float32)
+            grown[:self._length] = self._data[:self._length]
+            self._data = grown
+        self._data[self._length:end] = block
+        start, self._length = self._length, end
+        return self._data[start:end]
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def seconds(self):
+        return self._length / self.sr
+
+    def audio(self):
+        """The samples recorded so far, as a view (no copy)."""
+        return self._data[:self._length]
+
+
+def archive_recording(audio, sr, directory, prefix="recording"):
+    """Save a recording as a 16-bit WAV in directory and return its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 1000000:06d}.wav")
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sr)
+        wf.writeframes((np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+    return path
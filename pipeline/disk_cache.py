@@ -0,0 +1,109 @@
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+
+def content_key(*parts):
+    """Hash the given parts into a stable hex key (None and non-strings are allowed)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        # Length-prefix every part so ("ab", "c") and ("a", "bc") never collide
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class DiskLRUCache:
+    """
+    A directory of content-addressed files capped at max_bytes.
+
+    File modification times double as the LRU clock: a hit touches the file and,
+    when a put goes over the cap, the least recently used files are removed first.
+    Writes go through a temp file and os.replace, so readers never see partial entries.
+    Entries pinned by a reader (e.g. a clip queued for playback) are never evicted.
+    """
+
+    def __init__(self, directory, max_bytes=100 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # path -> number of readers holding it
+        self._pins = {}
+        self._pin_lock = threading.Lock()
+
+    def path(self, key, suffix=""):
+        return self.directory / f"{key}{suffix}"
+
+    def get(self, key, suffix="", pin=False):
+        """Return the path of a cached entry (marking it as recently used), or None on a miss."""
+        path = self.path(key, suffix)
+        if pin:
+            self.pin(path)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            if pin:
+                self.unpin(path)
+            return None
+        return path
+
+    def pin(self, path):
+        """Keep path from being evicted until a matching unpin()."""
+        with self._pin_lock:
+            self._pins[Path(path)] = self._pins.get(Path(path), 0) + 1
+
+    def unpin(self, path):
+        with self._pin_lock:
+            count = self._pins.pop(Path(path), 0) - 1
+            if count > 0:
+                self._pins[Path(path)] = count
+
+    def reserve(self, suffix=""):
+        """Return a fresh temp path inside the cache directory for a writer to fill in."""
+        fd, tmp_path = tempfile.mkstemp(suffix=suffix + ".tmp", dir=self.directory)
+        os.close(fd)
+        return Path(tmp_path)
+
+    def put_file(self, key, src_path, suffix="", pin=False):
+        """Move src_path (ideally from reserve()) into the cache under key and return the final path."""
+        path = self.path(key, suffix)
+        if pin:
+            self.pin(path)
+        os.replace(src_path, path)
+        self.evict()
+        return path
+
+    def put_bytes(self, key, data, suffix=""):
+        tmp_path = self.reserve(suffix)
+        tmp_path.write_bytes(data)
+        return self.put_file(key, tmp_path, suffix)
+
+    def clear(self):
+        for path in self.directory.iterdir():
+            if path.is_file():
+                path.unlink(missing_ok=True)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in self.directory.iterdir():
+            if not path.is_file() or path.suffix == ".tmp":
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            with self._pin_lock:
+                if path in self._pins:
+                    continue
+                path.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,136 @@
+import gc
+import threading
+import time
+
+# Process-wide model registry: every model is loaded once, put in eval() mode,
+# optionally warmed up, and then shared by everybody that asks for it.
+_loaders = {}
+_warmups = {}
+_models = {}
+_last_used = {}
+_load_locks = {}
+# Role (e.g. "asr", "ser") -> names of the models the current configuration uses for it
+_in_use = {}
+_lock = threading.Lock()
+
+_idle_timeout = None
+_evictor = None
+_evictor_stop = threading.Event()
+
+
+def register_model(name, loader, warmup=None):
+    """Register a loader (and an optional warmup function) under a model name."""
+    with _lock:
+        _loaders[name] = loader
+        if warmup is not None:
+            _warmups[name] = warmup
+        _load_locks.setdefault(name, threading.Lock())
+
+
+def is_registered(name):
+    return name in _loaders
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def loaded_models():
+    """Return the names of the models that are currently in memory."""
+    with _lock:
+        return list(_models)
+
+
+def get_model(name):
+    """Return the model registered under name, loading it on first use."""
+    model = _models.get(name)
+    if model is None:
+        if name not in _loaders:
+            raise KeyError(f"No model registered under '{name}'")
+        # One lock per model so two threads never deserialize the same weights,
+        # while different models can still load in parallel
+        with _load_locks[name]:
+            model = _models.get(name)
+            if model is None:
+                model = _load(name)
+    _last_used[name] = time.monotonic()
+    return model
+
+
+def _load(name):
+    start_time = time.time()
+    model = _loaders[name]()
+    if hasattr(model, "eval"):
+        model.eval()
+    with _lock:
+        _models[name] = model
+    print(f"Loaded model '{name}' in {time.time() - start_time:.2f}s")
+    return model
+
+
+def use_models(role, *names):
+    """Record the models the current configuration uses for a role; warmup() loads these by default."""
+    with _lock:
+        _in_use[role] = names
+
+
+def models_in_use():
+    with _lock:
+        return list(dict.fromkeys(name for names in _in_use.values() for name in names))
+
+
+def warmup(*names):
+    """Load the given models (the ones in use, see use_models, by default) and run their warmup functions."""
+    for name in names or models_in_use():
+        model = get_model(name)
+        if name in _warmups:
+            _warmups[name](model)
+
+
+def unload_model(name):
+    """Drop a model from memory; it is reloaded on the next get_model call."""
+    if name not in _load_locks:
+        return
+    with _load_locks[name]:
+        with _lock:
+            model = _models.pop(name, None)
+            _last_used.pop(name, None)
+    if model is not None:
+        del model
+        gc.collect()
+        print(f"Unloaded model '{name}'")
+
+
+def unload_all():
+    for name in loaded_models():
+        unload_model(name)
+
+
+def evict_idle(timeout_seconds):
+    """Unload every model that has not been used for timeout_seconds."""
+    now = time.monotonic()
+    for name in loaded_models():
+        if now - _last_used.get(name, now) > timeout_seconds:
+            unload_model(name)
+
+
+def enable_idle_eviction(timeout_seconds, check_interval=30.0):
+    """Opt in to freeing models that sit unused for longer than timeout_seconds."""
+    global _idle_timeout, _evictor
+    _idle_timeout = timeout_seconds
+    if _evictor is not None and _evictor.is_alive():
+        return
+    _evictor_stop.clear()
+
+    def run():
+        while not _evictor_stop.wait(check_interval):
+            evict_idle(_idle_timeout)
+
+    _evictor = threading.Thread(target=run, name="model-evictor", daemon=True)
+    _evictor.start()
+
+
+def disable_idle_eviction():
+    global _evictor
+    _evictor_stop.set()
+    _evictor = None
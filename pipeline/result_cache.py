@@ -0,0 +1,63 @@
+import json
+import os
+
+import numpy as np
+
+from pipeline.disk_cache import DiskLRUCache, content_key
+
+# Opt-in cache for model outputs (transcripts, emotion probabilities) on recordings we analyse
+# over and over. Entries are small JSON files keyed by a hash of the decoded 16 kHz samples plus
+# the model name and version, so a model or decoding change just stops matching the old entries,
+# which then age out of the LRU. Turn it on with enable_result_cache() or RESULT_CACHE=1.
+
+RESULT_CACHE_DIR = "data/output/result_cache"
+RESULT_CACHE_MAX_BYTES = 50 * 1024 * 1024
+# Bump when the way results are computed changes without a model change
+RESULT_CACHE_VERSION = 1
+
+_cache = None
+
+
+def enable_result_cache(directory=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+    global _cache
+    _cache = DiskLRUCache(directory, max_bytes)
+    return _cache
+
+
+def disable_result_cache():
+    global _cache
+    _cache = None
+
+
+def result_cache_enabled():
+    return _cache is not None
+
+
+def cached_result(kind, audio, model, version, compute):
+    """
+    Return compute() for this audio and model, from the cache when it has been computed before.
+
+    audio is the decoded float32 array the result is computed from; kind ("asr", "ser", ...),
+    model and version go into the key next to its bytes. A version of None (unknown) bypasses
+    the cache. compute must return something JSON serializable (numpy scalars are stored as
+    floats); hits and misses both return the deserialized value, so the types always match.
+    """
+    if _cache is None or version is None:
+        return compute()
+
+    samples = np.ascontiguousarray(audio, dtype=np.float32)
+    key = content_key(RESULT_CACHE_VERSION, kind, model, version, samples.tobytes())
+    path = _cache.get(key, ".json")
+    if path is not None:
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pass  # evicted or unreadable in the meantime; recompute
+
+    data = json.dumps(compute(), default=float)
+    _cache.put_bytes(key, data.encode("utf-8"), ".json")
+    return json.loads(data)
+
+
+if os.environ.get("RESULT_CACHE", "").strip().lower() in ("1", "true", "yes", "on"):
+    enable_result_cache()
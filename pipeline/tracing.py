@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Per-stage tracing for the voice pipeline.
+#
+#   with span("asr", model="whisper-small", audio_seconds=3.2):
+#       ...
+#
+# While tracing is disabled (the default) span() returns a shared no-op object, so an
+# instrumented call costs one function call. enable_tracing() turns it on and sends every
+# finished span to the given exporters. TRACE_JSONL=<path> and PROMETHEUS_PORT=<port>
+# enable the two exporters from the environment.
+
+_enabled = False
+_exporters = []
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_tag(self, key, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("name", "tags", "start", "duration")
+
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+        self.start = None
+        self.duration = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.tags["error"] = exc_type.__name__
+        _export(self.name, self.duration, self.tags)
+        return False
+
+    def set_tag(self, key, value):
+        self.tags[key] = value
+
+
+def span(name, **tags):
+    """Time a stage; tags (audio_seconds, prompt_tokens, model, ...) are exported with it."""
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, tags)
+
+
+def record(name, duration, **tags):
+    """Export a span whose duration was measured elsewhere (e.g. reported by Ollama)."""
+    if _enabled:
+        _export(name, duration, tags)
+
+
+def _export(name, duration, tags):
+    for exporter in _exporters:
+        try:
+            exporter.export(name, duration, tags)
+        except Exception as e:
+            print(f"❌ Trace exporter failed: {e}")
+
+
+def enable_tracing(*exporters):
+    global _enabled
+    _exporters.extend(exporters)
+    _enabled = True
+
+
+def disable_tracing():
+    global _enabled
+    _enabled = False
+    _exporters.clear()
+
+
+def tracing_enabled():
+    return _enabled
+
+
+def get_exporter(exporter_class):
+    return next((exporter for exporter in _exporters if isinstance(exporter, exporter_class)), None)
+
+
+class JsonlExporter:
+    """Append one JSON line per span to a file, rolling it over at max_bytes (keeping `backups` old files)."""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=3):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def export(self, name, duration, tags):
+        line = json.dumps({"ts": time.time(), "span": name, "duration_ms": round(duration * 1000, 3), **tags},
+                          default=str)
+        with self._lock:
+            if self.path.exists() and self.path.stat().st_size >= self.max_bytes:
+                self._roll_over()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def _roll_over(self):
+        for i in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{i}")
+            if older.exists():
+                os.replace(older, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+
+
+class PrometheusExporter:
+    """
+    Aggregate spans into a Prometheus histogram (pipeline_stage_seconds) labelled by stage and model.
+
+    render() returns the text exposition format; serve() exposes it on /metrics.
+    """
+
+    BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def export(self, name, duration, tags):
+        # Only low-cardinality tags become labels
+        labels = (("stage", name), ("model", str(tags.get("model", ""))))
+        with self._lock:
+            series = self._series.setdefault(labels, {"buckets": [0] * len(self.BUCKETS), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.BUCKETS):
+                if duration <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += duration
+            series["count"] += 1
+
+    def render(self):
+        lines = ["# HELP pipeline_stage_seconds Time spent in each stage of the voice pipeline.",
+                 "# TYPE pipeline_stage_seconds histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+                for bound, count in zip(self.BUCKETS, series["buckets"]):
+                    lines.append(f'pipeline_stage_seconds_bucket{{{label_text},le="{bound}"}} {count}')
+                lines.append(f'pipeline_stage_seconds_bucket{{{label_text},le="+Inf"}} {series["count"]}')
+                lines.append(f"pipeline_stage_seconds_sum{{{label_text}}} {series['sum']}")
+                lines.append(f"pipeline_stage_seconds_count{{{label_text}}} {series['count']}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve render() on http://host:port/metrics from a daemon thread (localhost only by default)."""
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = exporter.render().encode("utf-8")
+                self.send_response(200 if self.path == "/metrics" else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+
+def configure_from_env():
+    exporters = []
+    if os.environ.get("TRACE_JSONL"):
+        exporters.append(JsonlExporter(os.environ["TRACE_JSONL"]))
+    if os.environ.get("PROMETHEUS_PORT"):
+        prometheus = PrometheusExporter()
+        prometheus.serve(int(os.environ["PROMETHEUS_PORT"]), os.environ.get("PROMETHEUS_HOST", "127.0.0.1"))
+        exporters.append(prometheus)
+    if exporters:
+        enable_tracing(*exporters)
+
+
+configure_from_env()
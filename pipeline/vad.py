@@ -0,0 +1,65 @@
+import numpy as np
+
+# Energy-based voice activity detection on 16 kHz float32 buffers.
+# Cheap enough to run on every microphone block.
+
+
+def frame_energy_db(audio, sr, frame_ms=30):
+    """Return the RMS energy (dBFS) of each full, non-overlapping frame of the audio."""
+    frame = int(sr * frame_ms / 1000)
+    n_frames = len(audio) // frame
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(np.square(frames), axis=1) + 1e-12)
+    return 20 * np.log10(rms)
+
+
+def speech_mask(audio, sr, frame_ms=30, threshold_db=-40.0):
+    """Return one boolean per frame: True where the frame is loud enough to be speech."""
+    return frame_energy_db(audio, sr, frame_ms) > threshold_db
+
+
+def trim_silence(audio, sr, frame_ms=30, threshold_db=-40.0, pad_ms=150, max_pause_ms=None):
+    """
+    Cut leading and trailing silence (keeping pad_ms of it around the speech).
+
+    With max_pause_ms set, internal pauses longer than that are also shortened to max_pause_ms.
+    If no frame reaches threshold_db the audio is returned unchanged, so a quiet microphone
+    does not lose the whole utterance. Without max_pause_ms the result is a view of audio.
+    """
+    frame = int(sr * frame_ms / 1000)
+    mask = speech_mask(audio, sr, frame_ms, threshold_db)
+    if not mask.any():
+        return audio
+
+    speech = np.flatnonzero(mask)
+    pad = int(round(pad_ms / frame_ms))
+    first = max(0, speech[0] - pad)
+    last = speech[-1] + pad + 1  # frame index past the end; may run into the trailing partial frame
+    if max_pause_ms is None:
+        return audio[first * frame:last * frame]
+
+    # Frames to keep: speech, plus at most max_pause_ms of every pause between first and last
+    keep = mask.copy()
+    keep[first:speech[0]] = True
+    keep[speech[-1]:last] = True
+    max_pause = int(round(max_pause_ms / frame_ms))
+    gap_start = None
+    for i in range(first, min(last, len(keep))):
+        if not keep[i] and gap_start is None:
+            gap_start = i
+        elif keep[i] and gap_start is not None:
+            if i - gap_start <= max_pause:
+                keep[gap_start:i] = True
+            else:
+                # Keep both edges of a long pause so words don't run into each other
+                head = max_pause // 2
+                keep[gap_start:gap_start + head] = True
+                keep[i - (max_pause - head):i] = True
+            gap_start = None
+
+    samples = np.repeat(keep, frame)
+    # The trailing partial frame follows the last full one
+    samples = np.concatenate([samples, np.full(len(audio) - len(samples), keep[-1])])
+    samples[last * frame:] = False
+    samples[:first * frame] = False
+    return audio[samples]
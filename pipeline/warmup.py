@@ -0,0 +1,25 @@
+import threading
+import time
+
+
+def start_background_warmup(steps, on_done=None):
+    """
+    Run warmup steps one after another on a daemon thread.
+
+    steps is a list of (name, fn). A failing step is reported and skipped, so a missing
+    Ollama server, for example, does not keep the speech models from warming up.
+    """
+    def run():
+        for name, fn in steps:
+            start_time = time.time()
+            try:
+                fn()
+                print(f"Warmed up {name} in {time.time() - start_time:.2f}s")
+            except Exception as e:
+                print(f"❌ Warmup of {name} failed: {e}")
+        if on_done:
+            on_done()
+
+    thread = threading.Thread(target=run, name="warmup", daemon=True)
+    thread.start()
+    return thread
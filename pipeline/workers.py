@@ -0,0 +1,91 @@
+import itertools
+import queue
+import threading
+
+
+class Turn:
+    """One job flowing through a StagePipeline; once cancelled, no later stage touches it."""
+
+    def __init__(self, turn_id, payload):
+        self.id = turn_id
+        self.payload = payload
+        self.stage = 0
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+
+class StagePipeline:
+    """
+    Run a chain of stages on worker threads, one thread and one job queue per stage.
+
+    stages is a list of (name, fn) pairs; fn(turn, value) returns the value handed to the
+    next stage, or None to end the turn there. Because every stage has its own thread,
+    consecutive turns overlap (e.g. turn 2 is transcribed while turn 1 is still speaking).
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self._names = [name for name, _ in self.stages]
+        self._queues = [queue.Queue() for _ in self.stages]
+        self._ids = itertools.count(1)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, args=(index,), name=f"stage-{name}", daemon=True)
+                         for index, (name, _) in enumerate(self.stages)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, payload, stage=None):
+        """Queue a new turn, optionally entering the pipeline at the named stage."""
+        turn = Turn(next(self._ids), payload)
+        turn.stage = self._names.index(stage) if stage else 0
+        with self._lock:
+            self._in_flight[turn.id] = turn
+        self._queues[turn.stage].put((turn, payload))
+        return turn
+
+    def cancel_pending(self, before_stage=None):
+        """Cancel every in-flight turn that has not yet reached before_stage (all of them by default)."""
+        limit = self._names.index(before_stage) if before_stage else len(self.stages)
+        with self._lock:
+            for turn in self._in_flight.values():
+                if turn.stage < limit:
+                    turn.cancel()
+
+    def stop(self):
+        for stage_queue in self._queues:
+            stage_queue.put(None)
+
+    def _finish(self, turn):
+        with self._lock:
+            self._in_flight.pop(turn.id, None)
+
+    def _run(self, index):
+        name, fn = self.stages[index]
+        while True:
+            item = self._queues[index].get()
+            if item is None:
+                break
+            turn, value = item
+            if turn.cancelled:
+                self._finish(turn)
+                continue
+            try:
+                value = fn(turn, value)
+            except Exception as e:
+                print(f"❌ Stage '{name}' failed for turn {turn.id}: {e}")
+                value = None
+
+            if value is None or turn.cancelled or index + 1 == len(self.stages):
+                self._finish(turn)
+                continue
+            # Update the stage under the lock so cancel_pending sees a consistent view
+            with self._lock:
+                turn.stage = index + 1
+            self._queues[index + 1].put((turn, value))
@@ -0,0 +1,288 @@
+import argparse
+import base64
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+from chains import main as chains
+from pipeline.audio_loading import SAMPLE_RATE, load_audio_bytes
+from pipeline.model_registry import warmup
+from pipeline.tracing import JsonlExporter, PrometheusExporter, enable_tracing, get_exporter
+from textrecongnition.text_detection import (batching_metrics, enable_micro_batching, enable_model_tiering,
+                                             process_audio, tiering_report)
+from textrecongnition.text_to_speech import clean_ai_response, release, synthesize
+
+# Headless server for the voice pipeline: audio in, transcript + emotion + reply text + reply audio out.
+#
+#   POST /sessions                  {"user_id": "..."}            -> {"session_id": "..."}
+#   POST /sessions/<id>/turn        encoded audio file (wav, m4a, ...) -> turn result
+#   POST /sessions/<id>/chunks      raw float32 little-endian 16 kHz mono PCM, appended to the session
+#   POST /sessions/<id>/end         run a turn on the chunks streamed so far -> turn result
+#   DELETE /sessions/<id>
+#   GET /health
+#   GET /metrics                    per-stage latency histograms in the Prometheus text format
+#
+# Models are loaded once through the model registry and shared by all sessions;
+# inference runs on a bounded worker pool so load beyond it is rejected with 503. Request bodies and
+# the audio a session buffers through /chunks are capped (413 beyond the cap).
+
+SESSION_IDLE_SECONDS = 30 * 60
+# Larger request bodies, or more streamed audio per session than this, are answered with 413
+MAX_BODY_BYTES = 50 * 1024 * 1024
+MAX_BUFFERED_SECONDS = 10 * 60
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+class Session:
+    def __init__(self, user_id):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id or self.id
+        self.chunks = []
+        self.lock = threading.Lock()
+        self.last_active = time.time()
+
+
+class VoiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, workers=2, max_pending=8, tts=True, max_body_bytes=MAX_BODY_BYTES,
+                 max_buffered_seconds=MAX_BUFFERED_SECONDS):
+        super().__init__(address, RequestHandler)
+        self.max_body_bytes = max_body_bytes
+        self.max_buffered_samples = int(max_buffered_seconds * SAMPLE_RATE)
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="voice-worker")
+        # Turns running or waiting for a worker; more than this and clients get a 503
+        self.slots = threading.BoundedSemaphore(workers + max_pending)
+        self.tts = tts
+
+    def create_session(self, user_id):
+        session = Session(user_id)
+        with self.sessions_lock:
+            self._expire_sessions()
+            self.sessions[session.id] = session
+        return session
+
+    def get_session(self, session_id):
+        with self.sessions_lock:
+            session = self.sessions.get(session_id)
+        if session:
+            session.last_active = time.time()
+        return session
+
+    def drop_session(self, session_id):
+        with self.sessions_lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def _expire_sessions(self):
+        cutoff = time.time() - SESSION_IDLE_SECONDS
+        for session_id in [sid for sid, s in self.sessions.items() if s.last_active < cutoff]:
+            del self.sessions[session_id]
+
+    def run_turn(self, session, audio):
+        """Run one turn on the worker pool; returns None if the server is at capacity."""
+        if not self.slots.acquire(blocking=False):
+            return None
+        try:
+            return self.pool.submit(self._turn, session, audio).result()
+        finally:
+            self.slots.release()
+
+    def _turn(self, session, audio):
+        result = process_audio(audio)
+        reply = clean_ai_response(chains.conversational_rag_chain(
+            {"context": result["emotions"], "input": result["text"]}, session.user_id))
+
+        response = {"text": result["text"], "emotion": result["emotions"], "reply": reply,
+                    "timings": result["timings"]}
+        if self.tts and reply:
+            # Pinned while it is read, so a concurrent turn's cache eviction cannot delete it
+            path = Path(synthesize(reply, pin=True))
+            try:
+                response["audio"] = base64.b64encode(path.read_bytes()).decode("ascii")
+            finally:
+                release(path)
+            response["audio_format"] = path.suffix.lstrip(".")
+        return response
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length < 0:
+            raise ValueError(f"invalid Content-Length {length}")
+        if length > self.server.max_body_bytes:
+            raise RequestTooLarge(f"request body over {self.server.max_body_bytes} bytes")
+        return self.rfile.read(length)
+
+    def _route(self):
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        session = None
+        if len(parts) >= 2 and parts[0] == "sessions":
+            session = self.server.get_session(parts[1])
+            if session is None:
+                self._send_json(404, {"error": "unknown session"})
+                return None, None
+        return parts, session
+
+    def _respond_with_turn(self, session, audio):
+        if len(audio) == 0:
+            self._send_json(400, {"error": "no audio"})
+            return
+        result = self.server.run_turn(session, audio)
+        if result is None:
+            self._send_json(503, {"error": "server busy, retry later"})
+        else:
+            self._send_json(200, result)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "sessions": len(self.server.sessions),
+                                  "batching": batching_metrics(), "tiering": tiering_report()})
+        elif self.path == "/metrics" and get_exporter(PrometheusExporter):
+            body = get_exporter(PrometheusExporter).render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_DELETE(self):
+        parts, session = self._route()
+        if session is None:
+            if parts is not None:
+                self._send_json(404, {"error": "not found"})
+            return
+        self.server.drop_session(session.id)
+        self._send_json(200, {"deleted": session.id})
+
+    def do_POST(self):
+        try:
+            if self.path == "/sessions":
+                body = self._read_body()
+                user_id = json.loads(body).get("user_id") if body else None
+                self._send_json(200, {"session_id": self.server.create_session(user_id).id})
+                return
+
+            parts, session = self._route()
+            if session is None:
+                if parts is not None:
+                    self._send_json(404, {"error": "not found"})
+                return
+            action = parts[2] if len(parts) == 3 else None
+
+            if action == "turn":
+                body = self._read_body()
+                self._respond_with_turn(session, load_audio_bytes(body) if body else np.zeros(0, dtype=np.float32))
+            elif action == "chunks":
+                chunk = np.frombuffer(self._read_body(), dtype="<f4")
+                with session.lock:
+                    buffered = sum(map(len, session.chunks)) + len(chunk)
+                    if buffered > self.server.max_buffered_samples:
+                        raise RequestTooLarge(f"more than {self.server.max_buffered_samples / SAMPLE_RATE:.0f} "
+                                              f"seconds of audio buffered; end the turn first")
+                    session.chunks.append(chunk)
+                self._send_json(200, {"buffered_seconds": buffered / SAMPLE_RATE})
+            elif action == "end":
+                with session.lock:
+                    chunks, session.chunks = session.chunks, []
+                audio = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+                self._respond_with_turn(session, audio)
+            else:
+                self._send_json(404, {"error": "not found"})
+        except RequestTooLarge as e:
+            # The body may not have been read, so the connection cannot be reused
+            self.close_connection = True
+            self._send_json(413, {"error": str(e)})
+        except Exception as e:
+            print(f"❌ Request {self.path} failed: {e}")
+            self._send_json(500, {"error": str(e)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-session server for the voice pipeline")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2, help="turns processed in parallel")
+    parser.add_argument("--max-pending", type=int, default=8, help="turns allowed to wait for a worker")
+    parser.add_argument("--ollama-url", help="base URL of Ollama or a local stand-in for it")
+    parser.add_argument("--fake-llm", action="store_true", help="answer with a canned reply instead of calling Ollama")
+    parser.add_argument("--in-memory-threads", action="store_true",
+                        help="keep conversations in memory instead of the SQLite checkpointer (lost on restart)")
+    parser.add_argument("--max-body-mb", type=float, default=MAX_BODY_BYTES / 2**20,
+                        help="largest accepted request body; bigger ones get a 413")
+    parser.add_argument("--max-buffered-seconds", type=float, default=MAX_BUFFERED_SECONDS,
+                        help="most audio a session may stream with /chunks before calling /end")
+    parser.add_argument("--no-tts", action="store_true", help="return text only, without synthesized audio")
+    parser.add_argument("--batch-wait-ms", type=float, default=0,
+                        help="collect ASR/SER requests across sessions for up to this long and run them as one batch")
+    parser.add_argument("--max-batch-seconds", type=float, default=60.0, help="cap on the audio in one batch")
+    parser.add_argument("--tiering", action="store_true",
+                        help="pick Whisper/SER model sizes per utterance to stay within --slo-seconds")
+    parser.add_argument("--slo-seconds", type=float, default=2.0, help="latency target for --tiering")
+    parser.add_argument("--no-warmup", action="store_true", help="load models on the first request instead of at startup")
+    parser.add_argument("--no-metrics", action="store_true", help="disable tracing and the /metrics endpoint")
+    parser.add_argument("--trace-jsonl", help="also write every span to this JSONL file (rolled over at 10 MB)")
+    args = parser.parse_args()
+
+    if not args.no_metrics:
+        exporters = [] if get_exporter(PrometheusExporter) else [PrometheusExporter()]
+        if args.trace_jsonl:
+            exporters.append(JsonlExporter(args.trace_jsonl))
+        enable_tracing(*exporters)
+
+    if args.fake_llm:
+        from langchain_core.language_models import FakeListChatModel
+        chains.set_llm(FakeListChatModel(responses=["I hear you. Let's take a deep breath together."]))
+    elif args.ollama_url:
+        from langchain_ollama import ChatOllama
+        chains.set_llm(ChatOllama(model="llama3.2", temperature=0, base_url=args.ollama_url))
+
+    # Per-user threads survive restarts, as in the desktop app
+    if not args.in_memory_threads:
+        chains.use_sqlite_checkpointer()
+    if args.tiering:
+        enable_model_tiering(slo_seconds=args.slo_seconds)
+    if args.batch_wait_ms > 0:
+        enable_micro_batching(args.batch_wait_ms, args.max_batch_seconds, max_batch_size=args.workers)
+
+    if not args.no_warmup:
+        warmup()
+
+    server = VoiceServer((args.host, args.port), workers=args.workers, max_pending=args.max_pending,
+                         tts=not args.no_tts, max_body_bytes=int(args.max_body_mb * 2**20),
+                         max_buffered_seconds=args.max_buffered_seconds)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
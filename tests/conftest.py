@@ -0,0 +1,35 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="session")
+def bundled_audio():
+    """The bundled recordings as 16 kHz float32 arrays, by file name (decoding m4a needs ffmpeg)."""
+    if shutil.which("ffmpeg") is None:
+        pytest.skip("decoding the bundled m4a clips needs ffmpeg")
+    audio_loading = pytest.importorskip("pipeline.audio_loading")
+    return {clip.name: audio_loading.load_audio(clip) for clip in audio_loading.BUNDLED_CLIPS}
+
+
+@pytest.fixture(scope="session")
+def ser_model():
+    """The full-precision emotion classifier; skips when it cannot be loaded (no torch or no download)."""
+    emreco = pytest.importorskip("emorecognition.emreco")
+    try:
+        return emreco.get_ser_model("torch")
+    except Exception as e:
+        pytest.skip(f"SER model unavailable: {e}")
+
+
+@pytest.fixture
+def no_result_cache():
+    result_cache = pytest.importorskip("pipeline.result_cache")
+    was_enabled = result_cache.result_cache_enabled()
+    result_cache.disable_result_cache()
+    yield
+    if was_enabled:
+        result_cache.enable_result_cache()
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from pipeline.batching import MicroBatcher
+
+
+def test_backlog_is_drained_into_full_batches():
+    """Requests that queue up while a slow batch runs go out together, not one by one."""
+    def slow_batch(audios):
+        time.sleep(0.2)
+        return [len(audio) for audio in audios]
+
+    batcher = MicroBatcher(slow_batch, "test", max_wait_ms=10, max_batch_size=8)
+    try:
+        results = [None] * 16
+        start = threading.Barrier(16)
+
+        def call(i):
+            start.wait()
+            results[i] = batcher([0.0] * (i + 1))
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        assert results == [i + 1 for i in range(16)]
+        metrics = batcher.metrics()
+        # The first batch may leave early with whatever had arrived; the rest is drained in full batches
+        assert metrics["batches"] <= 3
+        assert metrics["batch_sizes"].get(1, 0) <= 1
+    finally:
+        batcher.close()
+
+
+def test_drain_respects_the_audio_cap():
+    batches = []
+    release = threading.Event()
+
+    def batch_fn(audios):
+        release.wait(timeout=10)
+        batches.append([len(audio) for audio in audios])
+        return [None] * len(audios)
+
+    batcher = MicroBatcher(batch_fn, "test", max_wait_ms=1, max_batch_seconds=5, max_batch_size=8, sr=1)
+    try:
+        blocker = batcher.submit([0.0])
+        time.sleep(0.05)  # the batcher is now stuck in the first batch
+        futures = [batcher.submit([0.0, 0.0]) for _ in range(3)]
+        time.sleep(0.05)
+        release.set()
+        blocker.result(timeout=10)
+        for future in futures:
+            future.result(timeout=10)
+        # The backlog is drained up to 5 seconds of audio; the third clip starts the next batch
+        assert batches == [[1], [2, 2], [2]]
+    finally:
+        batcher.close()
@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+pytest.importorskip("langgraph.checkpoint.sqlite")
+chains = pytest.importorskip("chains.main")
+from langchain_core.language_models import FakeListChatModel
+
+
+@pytest.fixture
+def sqlite_chains(monkeypatch, tmp_path):
+    # Put the in-memory graph back afterwards, so other tests keep their MemorySaver
+    monkeypatch.setattr(chains, "app", chains.app)
+    monkeypatch.setattr(chains, "memory", chains.memory)
+    monkeypatch.setattr(chains, "llm", FakeListChatModel(responses=["first", "second", "third"]))
+    opened = []
+
+    def open_db(max_checkpoints=3):
+        opened.append(chains.use_sqlite_checkpointer(tmp_path / "checkpoints.sqlite3", max_checkpoints=max_checkpoints))
+        return tmp_path / "checkpoints.sqlite3"
+
+    yield open_db
+    for saver in opened:
+        saver.conn.close()
+
+
+def test_thread_is_restored_after_reopening_and_pruned(sqlite_chains):
+    path = sqlite_chains(max_checkpoints=3)
+    for text in ["hello", "I am stressed", "about exams"]:
+        chains.conversational_rag_chain({"input": text, "context": "Sad"}, "student")
+    chains.memory.conn.close()
+
+    # A fresh checkpointer on the same file, as after a restart
+    sqlite_chains(max_checkpoints=3)
+    assert chains.has_thread_state("student")
+    assert not chains.has_thread_state("someone else")
+    messages = chains.app.get_state({"configurable": {"thread_id": "student"}}).values["messages"]
+    assert [message.content for message in messages] == [
+        "hello", "first", "I am stressed", "second", "about exams", "third"]
+
+    with sqlite3.connect(path) as conn:
+        count = conn.execute("SELECT COUNT(*) FROM checkpoints WHERE thread_id = 'student'").fetchone()[0]
+    assert count == 3
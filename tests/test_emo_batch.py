@@ -0,0 +1,24 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+# Batched SER pads clips to a common length and masks the padding out; that relies on the
+# remote model code honouring the mask, so check the results against one clip at a time.
+
+TOLERANCE = 1e-3
+
+
+def test_batch_matches_single_clip_predictions(bundled_audio, ser_model, no_result_cache, monkeypatch):
+    from emorecognition import emreco
+    monkeypatch.setattr(emreco, "_ser_backend", "torch")
+    clips = list(bundled_audio.values())
+    assert len({len(audio) for audio in clips}) > 1, "need clips of different lengths to exercise the padding"
+
+    # One batch holding every clip, so the shorter ones are padded
+    batched = emreco.emo_predict_batch(clips, max_batch_seconds=10_000)
+
+    for name, audio, batch_probs in zip(bundled_audio, clips, batched):
+        single = emreco.emo_predictor(audio, backend="torch")
+        assert batch_probs.keys() == single.keys()
+        np.testing.assert_allclose([batch_probs[label] for label in single], list(single.values()),
+                                   atol=TOLERANCE, err_msg=name)
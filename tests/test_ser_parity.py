@@ -0,0 +1,21 @@
+import pytest
+
+# The accelerated SER backends must stay within tolerance of the full-precision torch model
+# on the bundled clips (same check as `python -m emorecognition.accelerated parity`).
+
+TOLERANCE = 0.05
+
+
+@pytest.mark.parametrize("backend", ["int8", "onnx"])
+def test_backend_matches_torch_model(backend, bundled_audio, ser_model):
+    if backend.startswith("onnx"):
+        pytest.importorskip("onnx")
+        pytest.importorskip("onnxruntime")
+    accelerated = pytest.importorskip("emorecognition.accelerated")
+    from pipeline.model_registry import get_model
+    try:
+        get_model(accelerated.SER_BACKENDS[backend])
+    except Exception as e:
+        pytest.skip(f"{backend} backend unavailable: {e}")
+
+    assert accelerated.parity_check(backend, tolerance=TOLERANCE)
@@ -0,0 +1,173 @@
+import io
+import json
+import shutil
+import threading
+import urllib.error
+import urllib.request
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+server = pytest.importorskip("server")
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from chains import main as chains
+
+# VoiceServer end to end with a local stand-in for Ollama (a chat model that echoes the user)
+# and a stub for the speech models, so the test needs neither Ollama nor model downloads.
+
+
+class EchoChatModel(BaseChatModel):
+    @property
+    def _llm_type(self):
+        return "echo"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="echo: " + messages[-1].content))])
+
+
+class FakeSpeechModels:
+    """Stands in for process_audio: the transcript is the clip length, and turns can be held back."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Semaphore(0)
+        self.barrier = None
+
+    def __call__(self, audio):
+        self.started.release()
+        if self.barrier is not None:
+            self.barrier.wait(timeout=10)
+        assert self.release.wait(timeout=10)
+        return {"text": f"{len(audio)} samples", "emotions": "Neutral", "timings": {}}
+
+
+@pytest.fixture
+def voice_server(monkeypatch):
+    speech = FakeSpeechModels()
+    monkeypatch.setattr(server, "process_audio", speech)
+    monkeypatch.setattr(chains, "llm", EchoChatModel())
+    servers = []
+
+    def start(workers=2, max_pending=0, **limits):
+        voice = server.VoiceServer(("127.0.0.1", 0), workers=workers, max_pending=max_pending, tts=False, **limits)
+        threading.Thread(target=voice.serve_forever, daemon=True).start()
+        servers.append(voice)
+        return f"http://127.0.0.1:{voice.server_address[1]}", speech
+
+    yield start
+    for voice in servers:
+        voice.shutdown()
+        voice.server_close()
+        voice.pool.shutdown()
+
+
+def request(url, data=None, method="POST"):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data, method=method), timeout=20) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def new_session(base, user_id):
+    status, body = request(base + "/sessions", json.dumps({"user_id": user_id}).encode())
+    assert status == 200
+    return body["session_id"]
+
+
+def send_chunks_and_end(base, session, samples):
+    chunk = np.zeros(samples // 2, dtype="<f4").tobytes()
+    for _ in range(2):
+        assert request(f"{base}/sessions/{session}/chunks", chunk)[0] == 200
+    return request(f"{base}/sessions/{session}/end")
+
+
+def test_chunks_then_end_runs_a_turn(voice_server):
+    base, _ = voice_server()
+    session = new_session(base, "chunks-user")
+    status, body = send_chunks_and_end(base, session, 16000)
+    assert status == 200
+    assert body["text"] == "16000 samples"
+    assert body["reply"] == "echo: 16000 samples"
+    assert body["emotion"] == "Neutral"
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="decoding uploaded files needs ffmpeg")
+def test_turn_with_an_encoded_file(voice_server):
+    base, _ = voice_server()
+    session = new_session(base, "turn-user")
+    wav = io.BytesIO()
+    with wave.open(wav, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(16000)
+        wf.writeframes(np.zeros(8000, dtype=np.int16).tobytes())
+    status, body = request(f"{base}/sessions/{session}/turn", wav.getvalue())
+    assert status == 200
+    assert body["reply"] == "echo: 8000 samples"
+
+
+def test_busy_server_answers_503(voice_server):
+    base, speech = voice_server(workers=1, max_pending=0)
+    speech.release.clear()
+    first = new_session(base, "busy-1")
+    second = new_session(base, "busy-2")
+
+    results = {}
+    blocked = threading.Thread(target=lambda: results.update(first=send_chunks_and_end(base, first, 1600)))
+    blocked.start()
+    assert speech.started.acquire(timeout=10)  # the only slot is taken
+
+    status, body = send_chunks_and_end(base, second, 1600)
+    assert status == 503
+
+    speech.release.set()
+    blocked.join(timeout=20)
+    assert results["first"][0] == 200
+
+
+def test_concurrent_sessions_get_their_own_replies(voice_server):
+    base, speech = voice_server(workers=2)
+    # Both turns have to be inside the speech stage at the same time
+    speech.barrier = threading.Barrier(2)
+    sessions = {new_session(base, f"concurrent-{n}"): n for n in (1600, 3200)}
+
+    results = {}
+    threads = [threading.Thread(target=lambda s=s, n=n: results.update({s: send_chunks_and_end(base, s, n)}))
+               for s, n in sessions.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    for session, samples in sessions.items():
+        status, body = results[session]
+        assert status == 200
+        assert body["reply"] == f"echo: {samples} samples"
+
+
+def test_oversized_body_and_buffer_get_413(voice_server):
+    base, _ = voice_server(max_body_bytes=4000, max_buffered_seconds=1500 / 16000)
+    session = new_session(base, "large-user")
+    status, _ = request(f"{base}/sessions/{session}/chunks", np.zeros(1001, dtype="<f4").tobytes())
+    assert status == 413
+
+    chunk = np.zeros(1000, dtype="<f4").tobytes()
+    assert request(f"{base}/sessions/{session}/chunks", chunk)[0] == 200
+    assert request(f"{base}/sessions/{session}/chunks", chunk)[0] == 413
+    # The chunks accepted before the cap still make a turn
+    status, body = request(f"{base}/sessions/{session}/end")
+    assert status == 200
+    assert body["text"] == "1000 samples"
+
+
+def test_empty_turn_is_a_bad_request(voice_server):
+    base, _ = voice_server()
+    session = new_session(base, "empty-user")
+    assert request(f"{base}/sessions/{session}/turn", b"") == (400, {"error": "no audio"})
+    assert request(f"{base}/sessions/{session}/end") == (400, {"error": "no audio"})
@@ -0,0 +1,71 @@
+import ast
+
+import pytest
+
+from tests.conftest import REPO_ROOT
+
+
+def test_ui_setup_has_no_undefined_names():
+    """A name the GUI module uses but never defines only fails once a button is pressed, so catch it statically."""
+    pytest.importorskip("pyflakes")
+    from pyflakes import checker, messages
+
+    path = REPO_ROOT / "UI_setup.py"
+    tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+    undefined = [str(message) for message in checker.Checker(tree, filename=str(path)).messages
+                 if isinstance(message, messages.UndefinedName)]
+    assert undefined == []
+
+
+class FakeChains:
+    def __init__(self):
+        self.calls = []
+
+    def conversational_rag_chain(self, input, id):
+        self.calls.append((input, id))
+        return "reply"
+
+    def conversational_rag_chain_stream(self, input, id):
+        self.calls.append((input, id))
+        yield "reply"
+
+
+class FakePipeline:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, item, stage=None):
+        self.submitted.append(item)
+
+
+@pytest.fixture
+def ui(monkeypatch):
+    pytest.importorskip("tkinter")
+    pytest.importorskip("sounddevice")
+    import UI_setup
+    chains = FakeChains()
+    monkeypatch.setattr(UI_setup, "llm_chain", chains)
+    monkeypatch.setattr(UI_setup, "current_user_id", "student", raising=False)
+    return UI_setup, chains
+
+
+def test_chain_input_keeps_retrieved_context_out_of_the_thread(ui):
+    UI_setup, chains = ui
+    assert UI_setup.chain_response({"text": "hi", "emotions": "Sad"}, "past turns") == "reply"
+    assert list(UI_setup.chain_response_stream({"text": "hi", "emotions": "Sad"}, "past turns")) == ["reply"]
+    turn_input = {"context": "Sad", "input": "hi", "history": "past turns"}
+    assert chains.calls == [(turn_input, "student"), (turn_input, "student")]
+
+    UI_setup.chain_response({"text": "hello", "emotions": "neutral", "greeting": True}, "summary")
+    assert chains.calls[-1] == ({"context": "neutral", "input": "summary\n\nhello"}, "student")
+
+
+def test_stop_recording_hands_the_recording_to_the_pipeline(ui, monkeypatch):
+    UI_setup, _ = ui
+    pipeline = FakePipeline()
+    monkeypatch.setattr(UI_setup, "turn_pipeline", pipeline)
+    monkeypatch.setattr(UI_setup, "recording", "captured")
+    monkeypatch.setattr(UI_setup, "transcriber", None)
+    UI_setup.stop_recording()
+    assert pipeline.submitted == [("captured", None)]
+    assert UI_setup.is_recording is False
@@ -0,0 +1,113 @@
+import os
+from dataclasses import dataclass
+from importlib import metadata
+from typing import Optional
+
+import numpy as np
+import whisper
+
+from pipeline.model_registry import get_model, register_model
+
+# Speech-to-text engines behind transcribe_audio. Every engine takes a 16 kHz float32 array
+# and returns {"text", "avg_logprob"}; avg_logprob is the mean segment log-probability and
+# serves as a confidence score.
+
+# Whisper model sizes we know how to load; "small" is the one used by default
+WHISPER_SIZES = ("tiny", "base", "small", "medium")
+# Device for the openai-whisper models, e.g. WHISPER_DEVICE=cpu; by default whisper uses CUDA when available
+WHISPER_DEVICE = os.environ.get("WHISPER_DEVICE")
+
+
+@dataclass
+class DecodeOptions:
+    # None means greedy decoding
+    beam_size: Optional[int] = None
+    # Pin the language (e.g. "en") to skip language detection
+    language: Optional[str] = None
+    # Skip timestamp tokens; we only use the text
+    without_timestamps: bool = False
+
+
+def _mean_logprob(values):
+    values = [value for value in values if value is not None]
+    return float(np.mean(values)) if values else None
+
+
+def _whisper_loader(size):
+    return lambda: whisper.load_model(size, device=WHISPER_DEVICE)
+
+
+def whisper_fp16(model):
+    # fp16 only works on the GPU; on CPU whisper would warn and fall back to fp32 anyway
+    return model.device.type == "cuda"
+
+
+def warmup_whisper_model(model):
+    """Transcribe one second of silence so the first real utterance starts warm."""
+    model.transcribe(np.zeros(whisper.audio.SAMPLE_RATE, dtype=np.float32), fp16=whisper_fp16(model))
+
+
+class WhisperEngine:
+    """openai-whisper on PyTorch (fp16 on CUDA, fp32 on CPU); the original engine."""
+
+    def __init__(self, size="small"):
+        self.size = size
+        self.model_key = "whisper-" + size
+        # The checkpoints are pinned by the whisper release
+        self.version = whisper.__version__
+
+    def transcribe(self, audio, options):
+        model = get_model(self.model_key)
+        result = model.transcribe(
+            audio, fp16=whisper_fp16(model), beam_size=options.beam_size, language=options.language,
+            without_timestamps=options.without_timestamps)
+        return {"text": result["text"],
+                "avg_logprob": _mean_logprob([segment["avg_logprob"] for segment in result["segments"]])}
+
+
+def _faster_whisper_loader(size, compute_type, cpu_threads):
+    def load():
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise RuntimeError("The faster-whisper ASR engine needs faster-whisper (pip install faster-whisper)") from e
+        return WhisperModel(size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+    return load
+
+
+def _warmup_faster_whisper(model):
+    segments, _ = model.transcribe(np.zeros(16000, dtype=np.float32))
+    list(segments)
+
+
+class FasterWhisperEngine:
+    """Whisper on CTranslate2 (faster-whisper) with quantized weights, int8 by default."""
+
+    def __init__(self, size="small", compute_type="int8", cpu_threads=None):
+        self.size = size
+        self.model_key = f"faster-whisper-{size}-{compute_type}"
+        try:
+            self.version = metadata.version("faster-whisper")
+        except metadata.PackageNotFoundError:
+            self.version = "missing"
+        # cpu_threads is the engine's share of the cores (all of them if not given)
+        register_model(self.model_key, _faster_whisper_loader(size, compute_type, cpu_threads or os.cpu_count() or 4),
+                       warmup=_warmup_faster_whisper)
+
+    def transcribe(self, audio, options):
+        segments, _ = get_model(self.model_key).transcribe(
+            audio, beam_size=options.beam_size or 1, language=options.language,
+            without_timestamps=options.without_timestamps)
+        segments = list(segments)  # decoding happens lazily while iterating
+        return {"text": "".join(segment.text for segment in segments),
+                "avg_logprob": _mean_logprob([segment.avg_logprob for segment in segments])}
+
+
+ASR_ENGINES = {
+    "whisper": WhisperEngine,
+    "faster-whisper": FasterWhisperEngine,
+}
+
+# Register the models; they are loaded on first use through the model registry
+for size in WHISPER_SIZES:
+    register_model("whisper-" + size, _whisper_loader(size), warmup=warmup_whisper_model)
@@ -0,0 +1,144 @@
+import collections
+import threading
+import time
+
+import numpy as np
+
+from emorecognition.emreco import emo_predictor
+from pipeline.audio_loading import SAMPLE_RATE, load_audio
+from textrecongnition import text_detection
+from textrecongnition.asr_engines import WhisperEngine
+
+
+class Tier:
+    """One model size: the ASR engine and SER backend used for clips up to max_seconds long."""
+
+    def __init__(self, name, asr_engine, ser_backend="torch", max_seconds=None, rtf_guess=0.3):
+        self.name = name
+        self.asr_engine = asr_engine
+        self.ser_backend = ser_backend
+        self.max_seconds = max_seconds
+        # Seconds of ASR compute per second of audio; starts as a guess and is learned from traffic
+        self.rtf = rtf_guess
+
+
+def default_tiers():
+    return [
+        Tier("tiny", WhisperEngine("tiny"), "int8", max_seconds=3.0, rtf_guess=0.05),
+        Tier("base", WhisperEngine("base"), "int8", max_seconds=10.0, rtf_guess=0.1),
+        Tier("small", WhisperEngine("small"), "torch", max_seconds=None, rtf_guess=0.3),
+    ]
+
+
+class TierPolicy:
+    """
+    Pick the ASR/SER model size per utterance from its duration and a latency SLO.
+
+    A clip starts on the first tier whose max_seconds covers it, stepping down to smaller
+    tiers while the predicted latency (learned real-time factor x duration) would break the
+    SLO. If the transcript's mean log-probability is below min_confidence, the clip is
+    re-transcribed one tier up, as long as the predicted total still fits in the SLO.
+    Requests, escalations and ASR/SER latencies are counted per tier for tuning the thresholds.
+    Turns run on several threads at once, so the stats and learned RTFs are updated under a lock.
+    """
+
+    def __init__(self, tiers=None, slo_seconds=2.0, min_confidence=-1.0, rtf_smoothing=0.2):
+        self.tiers = tiers or default_tiers()
+        self.slo_seconds = slo_seconds
+        self.min_confidence = min_confidence
+        self.rtf_smoothing = rtf_smoothing
+        self.stats = {tier.name: {"requests": 0, "escalations": 0, "latencies": collections.deque(maxlen=1000),
+                                  "ser_latencies": collections.deque(maxlen=1000)}
+                      for tier in self.tiers}
+        self._lock = threading.Lock()
+
+    def predicted_latency(self, tier, duration):
+        return tier.rtf * duration
+
+    def select(self, duration):
+        """Return the index of the tier to start with for a clip of the given duration."""
+        index = next((i for i, tier in enumerate(self.tiers)
+                      if tier.max_seconds is None or duration <= tier.max_seconds), len(self.tiers) - 1)
+        while index > 0 and self.predicted_latency(self.tiers[index], duration) > self.slo_seconds:
+            index -= 1
+        return index
+
+    def _transcribe(self, index, audio, duration):
+        tier = self.tiers[index]
+        start_time = time.perf_counter()
+        result = text_detection.transcribe_audio_detailed(audio, engine=tier.asr_engine)
+        latency = time.perf_counter() - start_time
+        with self._lock:
+            if duration > 0:
+                tier.rtf += self.rtf_smoothing * (latency / duration - tier.rtf)
+            self.stats[tier.name]["requests"] += 1
+            self.stats[tier.name]["latencies"].append(latency)
+        return result, latency
+
+    def record_ser(self, index, latency):
+        with self._lock:
+            self.stats[self.tiers[index].name]["ser_latencies"].append(latency)
+
+    def transcribe(self, audio, duration):
+        """Transcribe with escalation; returns (result, tier index, number of escalations)."""
+        index = self.select(duration)
+        result, spent = self._transcribe(index, audio, duration)
+        escalations = 0
+        while (index + 1 < len(self.tiers)
+               and result["avg_logprob"] is not None and result["avg_logprob"] < self.min_confidence
+               and spent + self.predicted_latency(self.tiers[index + 1], duration) <= self.slo_seconds):
+            with self._lock:
+                self.stats[self.tiers[index].name]["escalations"] += 1
+            index += 1
+            escalations += 1
+            result, latency = self._transcribe(index, audio, duration)
+            spent += latency
+        return result, index, escalations
+
+    def report(self):
+        """Per-tier request and escalation counts, ASR/SER latency percentiles and the learned real-time factor."""
+        percentile = lambda values, q: float(np.percentile(values, q)) if values else None
+        report = {}
+        with self._lock:
+            for tier in self.tiers:
+                stats = self.stats[tier.name]
+                latencies, ser_latencies = list(stats["latencies"]), list(stats["ser_latencies"])
+                report[tier.name] = {
+                    "requests": stats["requests"],
+                    "escalations": stats["escalations"],
+                    "p50_latency": percentile(latencies, 50),
+                    "p95_latency": percentile(latencies, 95),
+                    "ser_p50_latency": percentile(ser_latencies, 50),
+                    "ser_p95_latency": percentile(ser_latencies, 95),
+                    "rtf": tier.rtf,
+                }
+        return report
+
+
+def process_audio_tiered(audio, policy, text=None):
+    """
+    Like process_audio, but with model sizes chosen per utterance by policy.
+
+    SER runs concurrently with the selected tier's backend (the starting tier's choice;
+    only ASR escalates). Pass text when the transcript is already known to skip ASR.
+    The result adds "tier" and "escalations" to the usual keys.
+    """
+    start_time = time.perf_counter()
+    audio, decode_time = text_detection._timed(load_audio, audio)
+    audio, vad_time = text_detection._vad_trim(audio)
+    duration = len(audio) / SAMPLE_RATE
+    start_index = policy.select(duration)
+    tier = policy.tiers[start_index]
+
+    ser_future = text_detection._ser_executor.submit(text_detection._timed, emo_predictor, audio, tier.ser_backend)
+    index, escalations, asr_time = start_index, 0, 0.0
+    if text is None:
+        asr_future = text_detection._asr_executor.submit(text_detection._timed, policy.transcribe, audio, duration)
+        (asr_result, index, escalations), asr_time = asr_future.result()
+        text = asr_result["text"]
+    emotion_probs, ser_time = ser_future.result()
+    policy.record_ser(start_index, ser_time)
+
+    timings = {"decode": decode_time, "vad": vad_time, "asr": asr_time, "ser": ser_time, "total": time.perf_counter() - start_time}
+    return {"text": text, "emotions": max(emotion_probs, key=emotion_probs.get),
+            "tier": policy.tiers[index].name, "escalations": escalations, "timings": timings}
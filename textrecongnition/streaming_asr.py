@@ -0,0 +1,92 @@
+import queue
+import threading
+
+import numpy as np
+
+from pipeline.vad import speech_mask
+
+
+class StreamingTranscriber:
+    """
+    Transcribe speech segments in the background while the user is still recording.
+
+    feed() is cheap enough to call from the sounddevice callback: it only queues the block.
+    A worker thread runs the VAD, cuts a segment whenever a pause of min_silence_ms follows
+    speech (or the segment reaches max_segment_seconds) and transcribes it right away, so
+    when recording stops only the last segment is left for finish() to process.
+    """
+
+    def __init__(self, sr=16000, frame_ms=30, threshold_db=-40.0, min_silence_ms=600,
+                 min_segment_seconds=1.0, max_segment_seconds=20.0, transcribe=None):
+        self.sr = sr
+        self.frame = int(sr * frame_ms / 1000)
+        self.frame_ms = frame_ms
+        self.threshold_db = threshold_db
+        self.min_silence_frames = max(1, min_silence_ms // frame_ms)
+        self.min_segment = int(min_segment_seconds * sr)
+        self.max_segment = int(max_segment_seconds * sr)
+        self.transcribe = transcribe
+
+        self.texts = []
+        self._blocks = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="streaming-asr", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def feed(self, block):
+        """Queue one block of microphone samples (called from the audio callback)."""
+        self._blocks.put(block)
+
+    def finish(self):
+        """Flush the last segment, wait for the worker and return the full transcript."""
+        self._blocks.put(None)
+        self._thread.join()
+        return " ".join(self.texts).strip()
+
+    def _transcribe(self, segment):
+        if self.transcribe is None:
+            # Imported here, on the worker thread, so creating a transcriber never waits for Whisper
+            from textrecongnition.text_detection import transcribe_audio
+            self.transcribe = transcribe_audio
+        text = self.transcribe(segment).strip()
+        if text:
+            self.texts.append(text)
+
+    def _run(self):
+        pending = np.zeros(0, dtype=np.float32)
+        analysed = 0  # samples of pending already run through the VAD
+        silent_frames = 0
+        heard_speech = False
+
+        while True:
+            block = self._blocks.get()
+            if block is None:
+                break
+            pending = np.concatenate([pending, np.asarray(block, dtype=np.float32).reshape(-1)])
+
+            # Run the VAD on the frames that arrived since the last block
+            n_frames = (len(pending) - analysed) // self.frame
+            if n_frames == 0:
+                continue
+            mask = speech_mask(pending[analysed:analysed + n_frames * self.frame], self.sr,
+                               self.frame_ms, self.threshold_db)
+            for is_speech in mask:
+                analysed += self.frame
+                silent_frames = 0 if is_speech else silent_frames + 1
+                heard_speech = heard_speech or is_speech
+
+                pause = heard_speech and silent_frames >= self.min_silence_frames and analysed >= self.min_segment
+                if pause or analysed >= self.max_segment:
+                    self._transcribe(pending[:analysed])
+                    pending = pending[analysed:]
+                    analysed = 0
+                    heard_speech = False
+                elif not heard_speech and silent_frames >= self.min_silence_frames:
+                    # Drop leading silence so it is neither buffered nor transcribed
+                    pending = pending[analysed:]
+                    analysed = 0
+
+        if len(pending) and (heard_speech or speech_mask(pending, self.sr, self.frame_ms, self.threshold_db).any()):
+            self._transcribe(pending)
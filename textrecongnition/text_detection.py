@@ -1,17 +1,87 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import whisper
 import torch
 import librosa
 from transformers import Wav2Vec2Processor, Wav2Vec2ForSequenceClassification
 from scipy.special import softmax
 
-from emorecognition.emreco import emo_predictor
+from emorecognition.emreco import SER_BACKENDS, emo_predictor, emo_predict_batch
+from pipeline.batching import MicroBatcher
+from pipeline.audio_loading import SAMPLE_RATE, load_audio
+from pipeline.model_registry import get_model, use_models
+from pipeline.result_cache import cached_result
+from pipeline.tracing import span
+from pipeline.vad import trim_silence
+from textrecongnition.asr_engines import ASR_ENGINES, DecodeOptions, WhisperEngine, whisper_fp16
 
 # The different emotion categories
 EMOTIONS = {0: 'Angry', 1: 'Sad', 2: 'Happy', 3: 'Surprise', 4: 'Fear', 5: 'Disgust', 6: 'Contempt', 7: 'Neutral'}
 
-# Load models
-# Whisper model for speech recognition
-whisper_model = whisper.load_model("small")
+
+def _thread_split(asr_share=0.6):
+    """Split torch's intra-op threads between the ASR and SER workers (Whisper gets the larger share)."""
+    total = max(2, torch.get_num_threads())
+    asr_threads = min(total - 1, max(1, round(total * asr_share)))
+    return asr_threads, total - asr_threads
+
+
+_asr_threads, _ser_threads = _thread_split()
+
+# Speech-to-text engine and decoding options used by transcribe_audio (see configure_asr)
+_asr_engine = WhisperEngine("small")
+_decode_options = DecodeOptions()
+use_models("asr", _asr_engine.model_key)
+
+
+def configure_asr(engine="whisper", size="small", beam_size=None, language=None, without_timestamps=False,
+                  compute_type="int8", cpu_threads=None):
+    """
+    Select the ASR engine and its decoding options.
+
+    engine is "whisper" (openai-whisper, fp32) or "faster-whisper" (CTranslate2 with
+    compute_type weights, int8 by default). Pinning language skips language detection.
+    faster-whisper runs its own thread pool; it gets cpu_threads, by default the ASR share of
+    the cores so it does not compete with SER running at the same time.
+    """
+    global _asr_engine, _decode_options
+    if engine == "faster-whisper":
+        _asr_engine = ASR_ENGINES[engine](size, compute_type, cpu_threads or _asr_threads)
+    else:
+        _asr_engine = ASR_ENGINES[engine](size)
+    _decode_options = DecodeOptions(beam_size=beam_size, language=language, without_timestamps=without_timestamps)
+    use_models("asr", _asr_engine.model_key)
+
+
+def get_asr_engine():
+    return _asr_engine
+
+
+# The engine can also be picked through the environment, e.g. ASR_ENGINE=faster-whisper ASR_LANGUAGE=en
+if os.environ.get("ASR_ENGINE") or os.environ.get("ASR_LANGUAGE"):
+    configure_asr(os.environ.get("ASR_ENGINE", "whisper"), os.environ.get("ASR_MODEL_SIZE", "small"),
+                  language=os.environ.get("ASR_LANGUAGE"), without_timestamps=True)
+
+# Silence trimming ahead of ASR and SER in process_audio (see configure_vad); None turns it off
+_vad_options = {"threshold_db": -40.0, "pad_ms": 150, "max_pause_ms": None}
+
+
+def configure_vad(enabled=True, threshold_db=-40.0, pad_ms=150, max_pause_ms=None):
+    """
+    Tune the silence trimming that process_audio applies before Whisper and the emotion model.
+
+    Frames below threshold_db (dBFS) count as silence; pad_ms of it is kept around the speech.
+    max_pause_ms also shortens long pauses inside the utterance.
+    """
+    global _vad_options
+    _vad_options = dict(threshold_db=threshold_db, pad_ms=pad_ms, max_pause_ms=max_pause_ms) if enabled else None
+
+
+if os.environ.get("VAD_TRIM") == "0":
+    configure_vad(enabled=False)
+
 # Load Wav2Vec2 emotion model (we can change this to some other model bc this does not predict very well)
 # emotion_model_name = "audeering/wav2vec2-large-robust-12-ft-emotion-msp-dim"
 # processor = Wav2Vec2Processor.from_pretrained(emotion_model_name)
@@ -19,9 +89,96 @@ whisper_model = whisper.load_model("small")
 # model.eval()
 
 
-def transcribe_audio(audio_path):
-    # Convert speech to text using Whisper.
-    return whisper_model.transcribe(audio_path)["text"]
+def transcribe_audio_detailed(audio, engine=None):
+    # Convert speech to text with the configured engine (or the given one); returns {"text", "avg_logprob"}
+    engine = engine or _asr_engine
+    audio = load_audio(audio)
+    # Decoding options change the transcript, so they are part of the cache key's version
+    return cached_result("asr", audio, engine.model_key, (engine.version, _decode_options),
+                         lambda: _transcribe(engine, audio))
+
+
+def _transcribe(engine, audio):
+    with span("asr", model=engine.model_key, audio_seconds=len(audio) / SAMPLE_RATE):
+        return engine.transcribe(audio, _decode_options)
+
+
+def transcribe_audio(audio):
+    # Convert speech to text; audio is a file path or a 16 kHz float32 array
+    return transcribe_audio_detailed(audio)["text"]
+
+
+def transcribe_batch(audios):
+    """
+    Transcribe several 16 kHz clips with one batched Whisper decode.
+
+    Clips that fit in Whisper's 30 second window are padded into one mel batch; longer ones
+    need the sliding transcribe loop and fall back to transcribe_audio one by one, as do
+    all clips when the configured engine is not openai-whisper.
+    """
+    audios = [load_audio(audio) for audio in audios]
+    if not isinstance(_asr_engine, WhisperEngine):
+        return [transcribe_audio(audio) for audio in audios]
+
+    model = get_model(_asr_engine.model_key)
+    texts = [None] * len(audios)
+    short = [i for i, audio in enumerate(audios) if len(audio) <= whisper.audio.N_SAMPLES]
+    for i in set(range(len(audios))) - set(short):
+        texts[i] = transcribe_audio(audios[i])
+
+    if short:
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(audios[i])), model.dims.n_mels)
+            for i in short]).to(model.device)
+        options = whisper.DecodingOptions(fp16=whisper_fp16(model), without_timestamps=True,
+                                          beam_size=_decode_options.beam_size, language=_decode_options.language)
+        with span("asr_batch", model=_asr_engine.model_key, clips=len(short),
+                  audio_seconds=sum(len(audios[i]) for i in short) / SAMPLE_RATE):
+            results = whisper.decode(model, mels, options)
+        for i, result in zip(short, results):
+            texts[i] = result.text
+    return texts
+
+
+# Cross-request micro-batching (off by default; the server turns it on for concurrent sessions)
+_asr_batcher = None
+_ser_batcher = None
+
+
+def enable_micro_batching(max_wait_ms=10, max_batch_seconds=60.0, max_batch_size=8):
+    """Route process_audio's ASR and SER calls through shared MicroBatchers."""
+    global _asr_batcher, _ser_batcher
+    # Each batcher thread gets its share of torch threads, like the process_audio executors
+    _asr_batcher = MicroBatcher(transcribe_batch, "asr", max_wait_ms, max_batch_seconds, max_batch_size,
+                                initializer=lambda: _pin_torch_threads(_asr_threads))
+    _ser_batcher = MicroBatcher(lambda audios: emo_predict_batch(audios, max_batch_seconds=max_batch_seconds),
+                                "ser", max_wait_ms, max_batch_seconds, max_batch_size,
+                                initializer=lambda: _pin_torch_threads(_ser_threads))
+
+
+def batching_metrics():
+    if _asr_batcher is None:
+        return {}
+    return {"asr": _asr_batcher.metrics(), "ser": _ser_batcher.metrics()}
+
+
+# Per-utterance model tiering (off by default; see textrecongnition/model_tiering.py)
+_tier_policy = None
+
+
+def enable_model_tiering(slo_seconds=2.0, min_confidence=-1.0):
+    """Let process_audio pick the ASR/SER model size per utterance to stay within slo_seconds."""
+    global _tier_policy
+    import emorecognition.accelerated  # registers the int8 SER model of the lower tiers
+    from textrecongnition.model_tiering import TierPolicy
+    _tier_policy = TierPolicy(slo_seconds=slo_seconds, min_confidence=min_confidence)
+    use_models("asr-tiers", *[tier.asr_engine.model_key for tier in _tier_policy.tiers])
+    use_models("ser-tiers", *[SER_BACKENDS[tier.ser_backend] for tier in _tier_policy.tiers])
+    return _tier_policy
+
+
+def tiering_report():
+    return _tier_policy.report() if _tier_policy is not None else {}
 
 
 # def predict_emotion(audio_path):
@@ -38,17 +195,95 @@ def transcribe_audio(audio_path):
 #     return probabilities.tolist()
 
 
-def process_audio(audio_path):
-    # Process audio file: speech-to-text + emotion recognition
-    text = transcribe_audio(audio_path)
-    emotion_probs = emo_predictor(audio_path)
+def _pin_torch_threads(threads):
+    """
+    Give the calling thread its own intra-op thread count.
+
+    torch.set_num_threads also stores a process-wide value, and every thread re-applies that value
+    in a lazy init on its first parallel op, which would overwrite a share set before it. Running
+    the lazy init first (get_num_threads does) and then setting the count pins it for this thread.
+    Threads that have not run a torch op yet still pick up whichever share was set last.
+    """
+    torch.get_num_threads()
+    torch.set_num_threads(threads)
+
+
+# One single-thread executor per stage, each pinned to its share of the cores, so the two
+# models running at once don't oversubscribe them
+_asr_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr",
+                                   initializer=_pin_torch_threads, initargs=(_asr_threads,))
+_ser_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ser",
+                                   initializer=_pin_torch_threads, initargs=(_ser_threads,))
+
+
+def _timed(fn, *args):
+    start_time = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start_time
+
+
+def _vad_trim(audio):
+    # Leading/trailing silence costs model time and can make Whisper hallucinate
+    if _vad_options is None:
+        return audio, 0.0
+    with span("vad", audio_seconds=len(audio) / SAMPLE_RATE):
+        return _timed(trim_silence, audio, SAMPLE_RATE, **_vad_options)
+
+
+def process_audio(audio, concurrent=True, text=None):
+    """
+    Process audio file (or 16 kHz array): speech-to-text + emotion recognition.
+
+    With concurrent=True Whisper and the emotion model run in parallel on their own
+    thread shares, so a turn takes about as long as the slower of the two. Pass text when
+    the transcript is already known (e.g. from StreamingTranscriber) to skip Whisper.
+    Silence is trimmed before either model runs (see configure_vad).
+    The result also carries per-stage wall-clock timings in seconds under "timings".
+    With model tiering enabled the models are chosen per utterance (and micro-batching is bypassed).
+    """
+    if _tier_policy is not None:
+        from textrecongnition.model_tiering import process_audio_tiered
+        return process_audio_tiered(audio, _tier_policy, text=text)
+
+    start_time = time.perf_counter()
+    # Decode once and hand the same buffer to both models
+    audio, decode_time = _timed(load_audio, audio)
+    audio, vad_time = _vad_trim(audio)
+
+    if _ser_batcher is not None:
+        # Both requests wait in their batchers at the same time; the timings include the queueing
+        asr_start = time.perf_counter()
+        asr_future = _asr_batcher.submit(audio) if text is None else None
+        emotion_probs, ser_time = _timed(_ser_batcher, audio)
+        asr_time = 0.0
+        if asr_future is not None:
+            text = asr_future.result()
+            asr_time = time.perf_counter() - asr_start
+    elif text is not None:
+        asr_time = 0.0
+        emotion_probs, ser_time = _timed(emo_predictor, audio)
+    elif concurrent:
+        asr_future = _asr_executor.submit(_timed, transcribe_audio, audio)
+        ser_future = _ser_executor.submit(_timed, emo_predictor, audio)
+        text, asr_time = asr_future.result()
+        emotion_probs, ser_time = ser_future.result()
+    else:
+        text, asr_time = _timed(transcribe_audio, audio)
+        emotion_probs, ser_time = _timed(emo_predictor, audio)
+
     most_likely_emotion = max(emotion_probs, key = emotion_probs.get)
     print("most_likely_emotion = ", most_likely_emotion)
     # Emotion = EMOTIONS[most_likely_emotion]
     # print("Emotion = ", Emotion)
     # emotion_dict = {EMOTIONS[i]: prob for i, prob in enumerate(emotion_probs)}
-    return {"text": text, "emotions": most_likely_emotion}
+    timings = {"decode": decode_time, "vad": vad_time, "asr": asr_time, "ser": ser_time,
+               "total": time.perf_counter() - start_time}
+    return {"text": text, "emotions": most_likely_emotion, "timings": timings}
+
 
+# e.g. MODEL_TIERING=1 TIER_SLO_SECONDS=1.5
+if os.environ.get("MODEL_TIERING", "").strip().lower() in ("1", "true", "yes", "on"):
+    enable_model_tiering(slo_seconds=float(os.environ.get("TIER_SLO_SECONDS", 2.0)))
 
 if __name__ == "__main__":
     print("Setting up")
@@ -1,20 +1,271 @@
 import re
+import queue
+import shutil
+import threading
+import wave
 from playsound import playsound
-from gtts import gTTS
 import os
 
+from pipeline.disk_cache import DiskLRUCache, content_key
+from pipeline.tracing import span
+
+TTS_CACHE_DIR = "data/output/tts_cache"
+TTS_CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+
 def clean_ai_response(response):
     """ Remove AI message headers like ===== AI MESSAGE ===== """
     return re.sub(r"=+\s* Ai Message \s*=+\s*", "", response).strip()
-def text_to_speech(text, output_file="data/output/output_2.mp3", lang="en"):
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+
+class GTTSEngine:
+    """ Google Translate TTS (needs network access) """
+    name = "gtts"
+    suffix = ".mp3"
+
+    def supports(self, lang):
+        return True
+
+    def synthesize(self, text, output_file, lang="en", voice=None):
+        from gtts import gTTS
+        tts = gTTS(text=text, lang=lang, slow=False)
+        tts.save(output_file)
+
+
+class Pyttsx3Engine:
+    """ Offline TTS through the platform's speech synthesizer (SAPI5, NSSpeechSynthesizer or eSpeak) """
+    name = "pyttsx3"
+    suffix = ".wav"
+
+    def __init__(self):
+        # The pyttsx3 driver is not thread-safe, so synthesis is serialized
+        self._lock = threading.Lock()
+        # lang -> id of an installed voice for it (None if there is none)
+        self._voices = {}
+
+    def _init(self):
+        try:
+            import pyttsx3
+        except ImportError as e:
+            raise RuntimeError("The offline TTS engine needs pyttsx3 (pip install pyttsx3)") from e
+        return pyttsx3.init()
+
+    def voice_for(self, lang):
+        """Return the id of an installed voice speaking lang (e.g. "en" or "en-gb"), or None."""
+        lang = lang.lower().replace("_", "-")
+        if lang not in self._voices:
+            with self._lock:
+                voices = self._init().getProperty("voices")
+            self._voices[lang] = next((voice.id for voice in voices if _speaks(voice, lang)), None)
+        return self._voices[lang]
+
+    def supports(self, lang):
+        return self.voice_for(lang) is not None
+
+    def synthesize(self, text, output_file, lang="en", voice=None):
+        voice = voice or self.voice_for(lang)
+        with self._lock:
+            engine = self._init()
+            if voice:
+                engine.setProperty("voice", voice)
+            engine.save_to_file(text, output_file)
+            engine.runAndWait()
+
+
+def _speaks(voice, lang):
+    # eSpeak reports languages as bytes with a leading priority byte (b"\x05en-gb"); SAPI5 often
+    # reports none, so then the voice id (e.g. ...\TTS_MS_EN-US_ZIRA_11.0) is checked instead
+    codes = []
+    for code in getattr(voice, "languages", None) or []:
+        if isinstance(code, bytes):
+            code = code.decode("utf-8", "ignore")
+        codes.append(re.sub(r"^[^a-z]+", "", code.lower().replace("_", "-")))
+    if codes:
+        return any(code == lang or code.startswith(lang + "-") for code in codes)
+    return lang.split("-")[0] in re.split(r"[^a-z]+", str(voice.id).lower())
+
+
+class NullEngine:
+    """ Writes a short silent WAV instead of speech; for benchmarks and headless tests """
+    name = "null"
+    suffix = ".wav"
+
+    def supports(self, lang):
+        return True
+
+    def synthesize(self, text, output_file, lang="en", voice=None):
+        with wave.open(output_file, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(16000)
+            wf.writeframes(b"\x00\x00" * 1600)
+
+
+ENGINES = {
+    "gtts": GTTSEngine,
+    "pyttsx3": Pyttsx3Engine,
+    "null": NullEngine,
+}
+
+# Offline by default; set TTS_ENGINE=gtts (or call set_tts_engine) to use Google TTS
+_engine = ENGINES[os.environ.get("TTS_ENGINE", "pyttsx3")]()
+_cache = None
+
+
+def set_tts_engine(name):
+    """ Select the TTS backend by name (see ENGINES) """
+    global _engine
+    _engine = ENGINES[name]()
+
+
+def get_tts_engine():
+    return _engine
+
+
+def _get_cache():
+    global _cache
+    if _cache is None:
+        _cache = DiskLRUCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES)
+    return _cache
+
+
+def synthesize(text, lang="en", voice=None, engine=None, pin=False):
+    """
+    Return the path of an audio file with text spoken, synthesizing it only on a cache miss.
+
+    Files are keyed by a hash of (engine, text, lang, voice), so repeated phrases like greetings
+    are served from disk and every distinct utterance has its own file. Without a voice for lang,
+    the offline engine falls back to gTTS. With pin=True the file is kept from cache eviction
+    until release(path), e.g. while it waits to be played.
+    """
+    engine = engine or _engine
+    if voice is None and not engine.supports(lang):
+        print(f"No {engine.name} voice for '{lang}', using gTTS")
+        engine = GTTSEngine()
+    cache = _get_cache()
+    key = content_key(engine.name, text, lang, voice)
+    with span("tts_synth", model=engine.name, chars=len(text)) as synth_span:
+        path = cache.get(key, engine.suffix, pin=pin)
+        synth_span.set_tag("cache_hit", path is not None)
+        if path is None:
+            tmp_path = cache.reserve(engine.suffix)
+            try:
+                engine.synthesize(text, str(tmp_path), lang, voice)
+            except Exception:
+                tmp_path.unlink(missing_ok=True)
+                raise
+            path = cache.put_file(key, tmp_path, engine.suffix, pin=pin)
+    return path
+
+
+def release(path):
+    """Let a clip returned by synthesize(..., pin=True) be evicted again."""
+    _get_cache().unpin(path)
+
+
+def text_to_speech(text, output_file=None, lang="en", voice=None, play=True):
     cleaned_text = clean_ai_response(text)
     print("cleaned = ", cleaned_text)
-    tts = gTTS(text=cleaned_text, lang=lang, slow=False)
-    tts.save(output_file)
+    path = synthesize(cleaned_text, lang, voice, pin=True)
+    try:
+        # Keep a copy where the caller asked for one
+        if output_file:
+            os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+            shutil.copyfile(path, output_file)
+
+        # Play the generated speech
+        if play:
+            with span("playback"):
+                playsound(str(path)) # Use playSound
+    finally:
+        release(path)
+    return output_file or path
+
+
+# A sentence ends at terminal punctuation (plus closing quotes/brackets) followed by whitespace,
+# or at a line break
+_SENTENCE_END = re.compile(r"^(.*?(?:[.!?…]+[\"')\]]*\s+|\n+))", re.S)
+
+
+def iter_sentences(tokens):
+    """ Group a stream of LLM tokens into sentences, yielding each one as soon as it is complete """
+    buffer = ""
+    for token in tokens:
+        buffer += token
+        while True:
+            match = _SENTENCE_END.match(buffer)
+            if not match:
+                break
+            buffer = buffer[match.end():]
+            sentence = match.group(1).strip()
+            if sentence:
+                yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
+
+class SpeechQueue:
+    """
+    Speak sentences in order while later ones are still being generated.
+
+    One thread synthesizes queued sentences and a second one plays them, so sentence n+1
+    is synthesized while sentence n is playing. Sentences of a cancelled turn are skipped, and
+    cancel() drops everything queued so far (the clip already playing finishes).
+    """
+
+    def __init__(self, lang="en", voice=None):
+        self.lang = lang
+        self.voice = voice
+        self._sentences = queue.Queue()
+        self._clips = queue.Queue()
+        # Bumped by cancel(); items queued under an older generation are dropped
+        self._generation = 0
+        threading.Thread(target=self._synthesize_loop, name="tts-synth", daemon=True).start()
+        threading.Thread(target=self._play_loop, name="tts-play", daemon=True).start()
+
+    def say(self, sentence, turn=None):
+        self._sentences.put((sentence, turn, self._generation))
+
+    def cancel(self):
+        """Skip every sentence queued so far, e.g. when the user starts speaking again."""
+        self._generation += 1
+
+    def _dropped(self, turn, generation):
+        return generation != self._generation or (turn is not None and turn.cancelled)
+
+    def close(self):
+        self._sentences.put(None)
+
+    def _synthesize_loop(self):
+        while True:
+            item = self._sentences.get()
+            if item is None:
+                self._clips.put(None)
+                break
+            sentence, turn, generation = item
+            if self._dropped(turn, generation):
+                continue
+            # Every distinct sentence has its own cache file, so synthesis never overwrites a clip being played
+            try:
+                # Pinned until played (or dropped), so cache eviction cannot delete a queued clip
+                path = synthesize(clean_ai_response(sentence), self.lang, self.voice, pin=True)
+            except Exception as e:
+                print(f"❌ Speech synthesis failed: {e}")
+                continue
+            self._clips.put((path, turn, generation))
 
-    # Play the generated speech
-    playsound(output_file) # Use playSound
+    def _play_loop(self):
+        while True:
+            item = self._clips.get()
+            if item is None:
+                break
+            path, turn, generation = item
+            try:
+                if not self._dropped(turn, generation):
+                    with span("playback"):
+                        playsound(str(path))
+            finally:
+                release(path)
 
 # Example usage
 # if __name__ == "__main__":